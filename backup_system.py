@@ -1,10 +1,14 @@
 import os
+import io
 import datetime
 import logging
-import zipfile
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import schedule
 import time
 import subprocess
+import zstandard as zstd
 from pcloud import PyCloud
 
 # Logger konfigurieren
@@ -15,6 +19,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger('BackupSystem')
 
+# Puffergröße für das Kopieren der Datenbank ins Archiv
+COPY_BUFFER_SIZE = 1 << 20
+# Zstandard-Stufe 3: besseres Verhältnis als Deflate bei höherem Durchsatz
+ZSTD_LEVEL = 3
+
 class BackupSystem:
     def __init__(self, email, password, backup_dir='backups', db_path='market_data.db'):
         """
@@ -31,88 +40,165 @@ class BackupSystem:
         self.backup_dir = backup_dir
         self.db_path = db_path
         
+        # pCloud-Client und Backup-Ordner werden beim ersten Upload ermittelt
+        self._pc = None
+        self._folder_id = None
+        
         # Backup-Verzeichnis erstellen, falls es nicht existiert
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
         
         logger.info("BackupSystem initialized")
     
+    def _create_snapshot(self, snapshot_path):
+        """
+        Erstellt über die SQLite Online-Backup-API eine konsistente Kopie der Datenbank
+        
+        Args:
+            snapshot_path: Zielpfad der Kopie
+        """
+        src = sqlite3.connect(self.db_path)
+        dst = sqlite3.connect(snapshot_path)
+        try:
+            # In einem Schritt kopieren: im WAL-Modus blockiert das keine Schreiber,
+            # eine schrittweise Kopie würde bei jeder fremden Änderung neu starten
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+    
     def create_local_backup(self):
         """
-        Erstellt ein lokales Backup der Datenbank
+        Erstellt ein Backup der Datenbank im Arbeitsspeicher
         
         Returns:
-            Pfad zur Backup-Datei oder None bei Fehler
+            Tupel (Dateiname, Backup-Daten) oder None bei Fehler
         """
         try:
             # Zeitstempel für Dateinamen generieren
             timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_filename = f"market_data_backup_{timestamp}.zip"
-            backup_path = os.path.join(self.backup_dir, backup_filename)
+            backup_filename = f"market_data_backup_{timestamp}.db.zst"
             
-            # ZIP-Datei erstellen
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                zipf.write(self.db_path, os.path.basename(self.db_path))
+            # Komprimiertes Backup im Speicher erstellen, damit Upload und lokale Kopie dieselben Bytes nutzen
+            # threads=-1 verteilt die Kompression auf alle CPU-Kerne
+            cctx = zstd.ZstdCompressor(level=ZSTD_LEVEL, threads=-1)
+            buffer = io.BytesIO()
             
-            logger.info(f"Local backup created at {backup_path}")
-            return backup_path
+            # Snapshot statt der laufenden Datenbankdatei komprimieren, damit das Backup nie halb geschrieben ist
+            with tempfile.TemporaryDirectory(dir=self.backup_dir) as tmp_dir:
+                snapshot_path = os.path.join(tmp_dir, os.path.basename(self.db_path))
+                self._create_snapshot(snapshot_path)
+                
+                with open(snapshot_path, 'rb') as src:
+                    cctx.copy_stream(src, buffer, size=os.path.getsize(snapshot_path),
+                                     read_size=COPY_BUFFER_SIZE, write_size=COPY_BUFFER_SIZE)
+            
+            logger.info(f"Backup {backup_filename} created in memory")
+            return backup_filename, buffer.getvalue()
         except Exception as e:
             logger.error(f"Error creating local backup: {str(e)}")
             return None
     
-    def upload_to_pcloud(self, file_path):
+    def save_local_backup(self, filename, data):
         """
-        Lädt ein Backup in pCloud hoch
+        Schreibt ein Backup in das lokale Backup-Verzeichnis
         
         Args:
-            file_path: Pfad zur hochzuladenden Datei
+            filename: Dateiname des Backups
+            data: Inhalt des Backups
             
         Returns:
             True bei Erfolg, False bei Fehler
         """
         try:
-            # Bei pCloud anmelden
-            pc = PyCloud(self.email, self.password, endpoint="nearest")
+            backup_path = os.path.join(self.backup_dir, filename)
+            with open(backup_path, 'wb') as f:
+                f.write(data)
             
-            # Backup-Ordner in pCloud erstellen oder finden
-            folder_name = "TradingSignalSystem_Backups"
-            
-            # Prüfen, ob der Ordner bereits existiert
-            folders = pc.listfolder(folderid=0)
-            folder_id = 0  # Root-Ordner als Standard
+            logger.info(f"Local backup created at {backup_path}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving local backup: {str(e)}")
+            return False
+    
+    def _get_pcloud_client(self):
+        """Liefert den angemeldeten pCloud-Client, die Anmeldung erfolgt nur beim ersten Aufruf"""
+        if self._pc is None:
+            self._pc = PyCloud(self.email, self.password, endpoint="nearest")
+        return self._pc
+    
+    def _get_backup_folder_id(self, pc):
+        """
+        Ermittelt die ID des Backup-Ordners in pCloud und legt ihn bei Bedarf an
+        
+        Args:
+            pc: Der angemeldete pCloud-Client
             
-            for item in folders['metadata']['contents']:
-                if item['name'] == folder_name and item['isfolder']:
-                    folder_id = item['folderid']
-                    break
+        Returns:
+            Die Ordner-ID oder None bei Fehler
+        """
+        if self._folder_id is not None:
+            return self._folder_id
+        
+        folder_name = "TradingSignalSystem_Backups"
+        
+        # Prüfen, ob der Ordner bereits existiert
+        folders = pc.listfolder(folderid=0)
+        for item in folders['metadata']['contents']:
+            if item['name'] == folder_name and item['isfolder']:
+                self._folder_id = item['folderid']
+                return self._folder_id
+        
+        # Ordner erstellen, falls er nicht existiert
+        result = pc.createfolder(name=folder_name, folderid=0)
+        if 'metadata' in result and 'folderid' in result['metadata']:
+            self._folder_id = result['metadata']['folderid']
+            return self._folder_id
+        
+        logger.error("Failed to create backup folder in pCloud")
+        return None
+    
+    def _reset_pcloud_client(self):
+        """Verwirft Client und Ordner-ID, damit beim nächsten Upload neu angemeldet wird"""
+        self._pc = None
+        self._folder_id = None
+    
+    def upload_to_pcloud(self, filename, data):
+        """
+        Lädt ein Backup in pCloud hoch
+        
+        Args:
+            filename: Dateiname des Backups in pCloud
+            data: Inhalt des Backups
             
-            # Ordner erstellen, falls er nicht existiert
-            if folder_id == 0:
-                result = pc.createfolder(name=folder_name, folderid=0)
-                if 'metadata' in result and 'folderid' in result['metadata']:
-                    folder_id = result['metadata']['folderid']
-                else:
-                    logger.error("Failed to create backup folder in pCloud")
-                    return False
+        Returns:
+            True bei Erfolg, False bei Fehler
+        """
+        try:
+            # Zwischengespeicherten Client und Backup-Ordner verwenden
+            pc = self._get_pcloud_client()
+            folder_id = self._get_backup_folder_id(pc)
+            if folder_id is None:
+                return False
             
             # Datei hochladen
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
-                filename = os.path.basename(file_path)
-                result = pc.uploadfile(
-                    data=file_data,
-                    filename=filename,
-                    folderid=folder_id
-                )
+            result = pc.uploadfile(
+                data=data,
+                filename=filename,
+                folderid=folder_id
+            )
             
             if 'metadata' in result and 'fileid' in result['metadata']:
                 logger.info(f"Backup {filename} uploaded to pCloud successfully")
                 return True
             else:
+                # Z. B. abgelaufene Anmeldung oder gelöschter Ordner
                 logger.error("Failed to upload backup to pCloud")
+                self._reset_pcloud_client()
                 return False
         except Exception as e:
             logger.error(f"Error uploading to pCloud: {str(e)}")
+            self._reset_pcloud_client()
             return False
     
     def cleanup_old_backups(self, keep_days=30):
@@ -124,16 +210,16 @@ class BackupSystem:
         """
         try:
             now = datetime.datetime.now()
-            cutoff = now - datetime.timedelta(days=keep_days)
+            cutoff_ts = (now - datetime.timedelta(days=keep_days)).timestamp()
             
-            for filename in os.listdir(self.backup_dir):
-                if filename.startswith("market_data_backup_") and filename.endswith(".zip"):
-                    filepath = os.path.join(self.backup_dir, filename)
-                    file_time = datetime.datetime.fromtimestamp(os.path.getmtime(filepath))
-                    
-                    if file_time < cutoff:
-                        os.remove(filepath)
-                        logger.info(f"Removed old backup: {filepath}")
+            # scandir liefert die Verzeichniseinträge samt zwischengespeichertem stat()
+            with os.scandir(self.backup_dir) as entries:
+                for entry in entries:
+                    # .zip für ältere Backups vor der Umstellung auf Zstandard
+                    if (entry.name.startswith("market_data_backup_") and entry.name.endswith((".zst", ".zip"))
+                            and entry.stat().st_mtime < cutoff_ts):
+                        os.remove(entry.path)
+                        logger.info(f"Removed old backup: {entry.path}")
             
             logger.info(f"Cleanup completed, removed backups older than {keep_days} days")
         except Exception as e:
@@ -143,20 +229,27 @@ class BackupSystem:
         """Führt den vollständigen Backup-Prozess durch"""
         logger.info("Starting backup process")
         
-        # Lokales Backup erstellen
-        backup_path = self.create_local_backup()
-        if not backup_path:
+        # Backup erstellen
+        backup = self.create_local_backup()
+        if not backup:
             logger.error("Backup process failed at local backup creation")
             return False
+        backup_filename, backup_data = backup
         
-        # Backup in pCloud hochladen
-        success = self.upload_to_pcloud(backup_path)
-        if not success:
-            logger.error("Backup process failed at pCloud upload")
-            return False
-        
-        # Alte Backups bereinigen
-        self.cleanup_old_backups()
+        # Upload, lokale Kopie und Bereinigung sind I/O-gebunden und laufen parallel
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            upload = executor.submit(self.upload_to_pcloud, backup_filename, backup_data)
+            local_copy = executor.submit(self.save_local_backup, backup_filename, backup_data)
+            
+            # Alte Backups bereinigen, während der Upload läuft
+            self.cleanup_old_backups()
+            
+            if not local_copy.result():
+                logger.warning("Local backup copy could not be written")
+            
+            if not upload.result():
+                logger.error("Backup process failed at pCloud upload")
+                return False
         
         logger.info("Backup process completed successfully")
         return True
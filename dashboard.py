@@ -16,62 +16,185 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Spalten mit wenigen Ausprägungen, die als Kategorie geladen werden
+CATEGORY_COLUMNS = ('symbol', 'signal_type', 'outcome', 'dominant_sentiment', 'overall_signal')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Konfidenz-Bereiche für die Performance-Analyse (rechte Grenze inklusive, wie bei pd.cut)
+CONFIDENCE_BINS = np.array([0, 0.7, 0.8, 0.9, 1.0])
+CONFIDENCE_LABELS = ['0-70%', '70-80%', '80-90%', '90-100%']
+
+# Diagramme werden serverseitig verdichtet, bevor sie an den Browser gehen
+HISTOGRAM_BINS = 20
+MAX_CHART_POINTS = 2000
+
+# Hintergrundfarben für die Sentiment-Spalte
+SENTIMENT_STYLES = {
+    'positive': 'background-color: rgba(0, 255, 0, 0.2)',
+    'negative': 'background-color: rgba(255, 0, 0, 0.2)',
+    'neutral': 'background-color: rgba(0, 0, 255, 0.2)'
+}
+
 # Datenbankverbindung
 @st.cache_resource
 def get_connection():
-    return sqlite3.connect('market_data.db')
+    conn = sqlite3.connect('market_data.db', check_same_thread=False)
+    # Das Dashboard liest nur; große Page-Cache- und mmap-Werte beschleunigen die Abfragen
+    conn.execute('PRAGMA query_only=1')
+    conn.execute('PRAGMA mmap_size=268435456')
+    conn.execute('PRAGMA cache_size=-8000')
+    return conn
+
+def read_query(query, params=()):
+    """
+    Führt eine Abfrage auf der gecachten Verbindung aus und liefert ein DataFrame
+    
+    Die Zeilen werden in einem Aufruf geholt und direkt als Records übernommen,
+    ohne den Umweg über die SQL-Schicht von pandas.
+    """
+    cursor = get_connection().execute(query, params)
+    columns = [description[0] for description in cursor.description]
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=columns, coerce_float=True)
+
+def prepare_dataframe(df):
+    """Parst Zeitstempel mit festem Format und wandelt Spalten mit wenigen Ausprägungen in Kategorien um"""
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format=TIMESTAMP_FORMAT, cache=True)
+    for column in CATEGORY_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype('category')
+    return df
+
+def bin_timestamps(timestamps, bins=HISTOGRAM_BINS):
+    """Ordnet jedem Zeitstempel den Beginn seines Intervalls bei gleich breiten Intervallen zu"""
+    values = timestamps.values
+    ticks = values.astype(np.int64)
+    start = ticks.min()
+    width = max((ticks.max() - start) / bins, 1)
+    codes = np.minimum((ticks - start) // width, bins - 1)
+    return (start + codes * width).astype(np.int64).astype(values.dtype)
+
+def downsample(df, max_points=MAX_CHART_POINTS):
+    """Dünnt ein DataFrame für Liniendiagramme auf höchstens max_points Zeilen aus, die letzte Zeile bleibt erhalten"""
+    step = -(-len(df) // max_points)
+    if step <= 1:
+        return df
+    return df.iloc[(len(df) - 1) % step::step]
+
+def build_signal_filter(symbols=(), signal_types=(), start_date=None, end_date=None):
+    """Baut die WHERE-Klausel samt Parametern für gefilterte Signal-Abfragen"""
+    conditions = []
+    params = []
+    
+    if symbols:
+        conditions.append(f"ts.symbol IN ({', '.join('?' * len(symbols))})")
+        params.extend(symbols)
+    
+    if signal_types:
+        conditions.append(f"ts.signal_type IN ({', '.join('?' * len(signal_types))})")
+        params.extend(signal_types)
+    
+    if start_date and end_date:
+        # Halboffenes Intervall, damit der Index auf timestamp genutzt werden kann
+        conditions.append("ts.timestamp >= ? AND ts.timestamp < ?")
+        params.extend([start_date.isoformat(), (end_date + datetime.timedelta(days=1)).isoformat()])
+    
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where_clause, params
 
 # Daten laden
-@st.cache_data(ttl=300)  # 5 Minuten Cache
-def load_signals_data():
+# Ein Cache-Eintrag pro Filterkombination, begrenzt auf die zuletzt genutzten
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def load_signals_data(symbols=(), signal_types=(), start_date=None, end_date=None):
+    where_clause, params = build_signal_filter(symbols, signal_types, start_date, end_date)
+    query = f"""
+    SELECT ts.symbol, ts.timestamp, ts.signal_type, ts.confidence, 
+           ts.close_price, ts.reason, ts.verified, ts.outcome
+    FROM trading_signals ts
+    {where_clause}
+    ORDER BY ts.timestamp DESC
+    """
+    df = read_query(query, params)
+    return prepare_dataframe(df)
+
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def load_signal_kpis(symbols=(), signal_types=(), start_date=None, end_date=None):
+    """Berechnet die Kennzahlen der Signal-Übersicht in einer einzigen Aggregationsabfrage"""
     conn = get_connection()
+    where_clause, params = build_signal_filter(symbols, signal_types, start_date, end_date)
+    query = f"""
+    SELECT COUNT(*),
+           COALESCE(SUM(ts.signal_type = 'BUY'), 0),
+           COALESCE(SUM(ts.signal_type = 'SELL'), 0),
+           COALESCE(SUM(ts.verified = 1), 0),
+           COALESCE(SUM(ts.verified = 1 AND ts.outcome = 'SUCCESS'), 0),
+           AVG(ts.confidence)
+    FROM trading_signals ts
+    {where_clause}
+    """
+    total, buy_count, sell_count, verified_count, success_count, avg_confidence = conn.execute(query, params).fetchone()
+    return {
+        'total': total,
+        'buy_count': buy_count,
+        'sell_count': sell_count,
+        'verified_count': verified_count,
+        'success_count': success_count,
+        'avg_confidence': avg_confidence
+    }
+
+@st.cache_data(ttl=300, max_entries=1, show_spinner=False)  # 5 Minuten Cache
+def load_verified_signals():
     query = """
-    SELECT ts.id, ts.symbol, ts.timestamp, ts.signal_type, ts.confidence, 
-           ts.close_price, ts.technical_signal, ts.sentiment_signal, 
-           ts.reason, ts.notified, ts.verified, ts.outcome
+    SELECT ts.symbol, ts.timestamp, ts.signal_type, ts.confidence, ts.outcome
     FROM trading_signals ts
+    WHERE ts.verified = 1
     ORDER BY ts.timestamp DESC
     """
-    df = pd.read_sql_query(query, conn)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    return df
+    df = read_query(query)
+    return prepare_dataframe(df)
 
-@st.cache_data(ttl=300)
-def load_technical_data():
-    conn = get_connection()
+@st.cache_data(ttl=300, max_entries=32, show_spinner=False)
+def load_technical_data(symbol):
     query = """
     SELECT ta.id, ta.symbol, ta.timestamp, ta.close_price, ta.sma_20, ta.sma_50, 
            ta.rsi, ta.macd_line, ta.signal_line, ta.overall_signal
     FROM technical_analysis ta
-    ORDER BY ta.timestamp DESC
+    WHERE ta.symbol = ?
+    ORDER BY ta.timestamp
     """
-    df = pd.read_sql_query(query, conn)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    return df
+    df = read_query(query, (symbol,))
+    return prepare_dataframe(df)
 
-@st.cache_data(ttl=300)
-def load_sentiment_data():
-    conn = get_connection()
+@st.cache_data(ttl=300, max_entries=32, show_spinner=False)
+def load_sentiment_data(symbol):
     query = """
     SELECT sr.news_id, sr.symbol, sr.negative_score, sr.neutral_score, sr.positive_score,
            sr.dominant_sentiment, sr.confidence, sr.timestamp, nd.title, nd.summary
     FROM sentiment_results sr
     JOIN news_data nd ON sr.news_id = nd.rowid
-    ORDER BY sr.timestamp DESC
+    WHERE sr.symbol = ?
+    ORDER BY sr.timestamp
     """
-    df = pd.read_sql_query(query, conn)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    return df
+    df = read_query(query, (symbol,))
+    return prepare_dataframe(df)
+
+@st.cache_data(ttl=300, max_entries=16, show_spinner=False)
+def load_distinct_values(table, column='symbol'):
+    """Liefert alle vorkommenden Werte einer Spalte, z. B. die Symbole einer Tabelle"""
+    conn = get_connection()
+    rows = conn.execute(f"SELECT DISTINCT {column} FROM {table} ORDER BY {column}").fetchall()
+    return [row[0] for row in rows]
+
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def load_table_stats(table):
+    """Liefert Anzahl der Einträge und den letzten Zeitstempel einer Tabelle"""
+    conn = get_connection()
+    count, last_timestamp = conn.execute(f"SELECT COUNT(*), MAX(timestamp) FROM {table}").fetchone()
+    return count, pd.to_datetime(last_timestamp) if last_timestamp else None
 
 # Titelbereich
 st.title("Trading Signal System Dashboard")
 st.subheader("Echtzeit-Überwachung und Performance-Analyse")
 
-# Daten laden
-signals_df = load_signals_data()
-technical_df = load_technical_data()
-sentiment_df = load_sentiment_data()
-
 # Tabs erstellen
 tab1, tab2, tab3, tab4 = st.tabs(["Signal-Übersicht", "Performance-Analyse", "Technische Indikatoren", "Sentiment-Analyse"])
 
@@ -85,14 +208,14 @@ with tab1:
     with col1:
         symbol_filter = st.multiselect(
             "Symbol auswählen",
-            options=sorted(signals_df['symbol'].unique()),
+            options=load_distinct_values('trading_signals'),
             default=[]
         )
     
     with col2:
         signal_type_filter = st.multiselect(
             "Signal-Typ",
-            options=sorted(signals_df['signal_type'].unique()),
+            options=load_distinct_values('trading_signals', 'signal_type'),
             default=[]
         )
     
@@ -103,46 +226,31 @@ with tab1:
             max_value=datetime.datetime.now()
         )
     
-    # Daten filtern
-    filtered_df = signals_df.copy()
-    
-    if symbol_filter:
-        filtered_df = filtered_df[filtered_df['symbol'].isin(symbol_filter)]
-    
-    if signal_type_filter:
-        filtered_df = filtered_df[filtered_df['signal_type'].isin(signal_type_filter)]
-    
-    if len(date_range) == 2:
-        start_date, end_date = date_range
-        filtered_df = filtered_df[
-            (filtered_df['timestamp'].dt.date >= start_date) & 
-            (filtered_df['timestamp'].dt.date <= end_date)
-        ]
+    # Gefilterte Daten direkt aus der Datenbank laden
+    start_date, end_date = date_range if len(date_range) == 2 else (None, None)
+    filtered_df = load_signals_data(tuple(symbol_filter), tuple(signal_type_filter), start_date, end_date)
     
     # Signale anzeigen
     if not filtered_df.empty:
         # KPIs
+        kpis = load_signal_kpis(tuple(symbol_filter), tuple(signal_type_filter), start_date, end_date)
         kpi1, kpi2, kpi3, kpi4 = st.columns(4)
         
         with kpi1:
-            st.metric("Anzahl Signale", len(filtered_df))
+            st.metric("Anzahl Signale", kpis['total'])
         
         with kpi2:
-            buy_count = len(filtered_df[filtered_df['signal_type'] == 'BUY'])
-            sell_count = len(filtered_df[filtered_df['signal_type'] == 'SELL'])
-            st.metric("BUY/SELL Verhältnis", f"{buy_count}/{sell_count}")
+            st.metric("BUY/SELL Verhältnis", f"{kpis['buy_count']}/{kpis['sell_count']}")
         
         with kpi3:
-            verified_count = len(filtered_df[filtered_df['verified'] == 1])
-            if verified_count > 0:
-                success_count = len(filtered_df[(filtered_df['verified'] == 1) & (filtered_df['outcome'] == 'SUCCESS')])
-                success_rate = success_count / verified_count * 100
+            if kpis['verified_count'] > 0:
+                success_rate = kpis['success_count'] / kpis['verified_count'] * 100
                 st.metric("Erfolgsrate", f"{success_rate:.1f}%")
             else:
                 st.metric("Erfolgsrate", "N/A")
         
         with kpi4:
-            avg_confidence = filtered_df['confidence'].mean() * 100
+            avg_confidence = (kpis['avg_confidence'] or 0.0) * 100
             st.metric("Durchschn. Konfidenz", f"{avg_confidence:.1f}%")
         
         # Signale-Tabelle
@@ -171,7 +279,7 @@ with tab1:
         
         with col1:
             # Signal-Typen nach Symbol
-            signal_counts = filtered_df.groupby(['symbol', 'signal_type']).size().reset_index(name='count')
+            signal_counts = filtered_df.groupby(['symbol', 'signal_type'], observed=True).size().reset_index(name='count')
             fig = px.bar(
                 signal_counts,
                 x='symbol',
@@ -183,13 +291,19 @@ with tab1:
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
-            # Zeitliche Verteilung der Signale
-            fig = px.histogram(
-                filtered_df,
+            # Zeitliche Verteilung der Signale, vorab in Intervalle eingeteilt und gezählt
+            time_counts = (
+                filtered_df.assign(timestamp=bin_timestamps(filtered_df['timestamp']))
+                .groupby(['timestamp', 'signal_type'], observed=True)
+                .size()
+                .reset_index(name='count')
+            )
+            fig = px.bar(
+                time_counts,
                 x='timestamp',
+                y='count',
                 color='signal_type',
-                title='Zeitliche Verteilung der Signale',
-                nbins=20
+                title='Zeitliche Verteilung der Signale'
             )
             st.plotly_chart(fig, use_container_width=True)
     else:
@@ -200,15 +314,15 @@ with tab2:
     st.header("Signal-Performance")
     
     # Nur verifizierte Signale
-    verified_df = signals_df[signals_df['verified'] == 1].copy()
+    verified_df = load_verified_signals()
+    # Erfolg einmalig als 0/1-Spalte kodieren, damit die Erfolgsraten als Gruppenmittel berechnet werden können
+    verified_df['hit'] = (verified_df['outcome'] == 'SUCCESS').astype(np.int8)
     
     if not verified_df.empty:
         # Erfolgsrate nach Symbol
         st.subheader("Erfolgsrate nach Symbol")
         
-        success_rate_df = verified_df.groupby('symbol')['outcome'].apply(
-            lambda x: (x == 'SUCCESS').mean() * 100
-        ).reset_index(name='success_rate')
+        success_rate_df = verified_df.groupby('symbol', observed=True)['hit'].mean().mul(100).reset_index(name='success_rate')
         
         fig = px.bar(
             success_rate_df,
@@ -225,9 +339,7 @@ with tab2:
         col1, col2 = st.columns(2)
         
         with col1:
-            signal_success_df = verified_df.groupby('signal_type')['outcome'].apply(
-                lambda x: (x == 'SUCCESS').mean() * 100
-            ).reset_index(name='success_rate')
+            signal_success_df = verified_df.groupby('signal_type', observed=True)['hit'].mean().mul(100).reset_index(name='success_rate')
             
             fig = px.bar(
                 signal_success_df,
@@ -240,10 +352,8 @@ with tab2:
         
         with col2:
             # Performance im Zeitverlauf
-            verified_df['date'] = verified_df['timestamp'].dt.date
-            performance_over_time = verified_df.groupby('date')['outcome'].apply(
-                lambda x: (x == 'SUCCESS').mean() * 100
-            ).reset_index(name='success_rate')
+            verified_df['date'] = verified_df['timestamp'].values.astype('datetime64[D]')
+            performance_over_time = verified_df.groupby('date')['hit'].mean().mul(100).reset_index(name='success_rate')
             
             fig = px.line(
                 performance_over_time,
@@ -258,15 +368,13 @@ with tab2:
         st.subheader("Konfidenz vs. Erfolgsrate")
         
         # Konfidenz in Bins einteilen
-        verified_df['confidence_bin'] = pd.cut(
-            verified_df['confidence'] * 100,
-            bins=[0, 70, 80, 90, 100],
-            labels=['70-80%', '80-90%', '90-100%', '100%']
-        )
+        confidence = verified_df['confidence'].to_numpy(dtype=float)
+        confidence_codes = np.digitize(confidence, CONFIDENCE_BINS, right=True) - 1
+        # Fehlende Werte und Werte außerhalb der Bereiche erhalten wie bei pd.cut keinen Bereich
+        confidence_codes[np.isnan(confidence) | (confidence_codes >= len(CONFIDENCE_LABELS))] = -1
+        verified_df['confidence_bin'] = pd.Categorical.from_codes(confidence_codes, CONFIDENCE_LABELS)
         
-        confidence_success_df = verified_df.groupby('confidence_bin')['outcome'].apply(
-            lambda x: (x == 'SUCCESS').mean() * 100
-        ).reset_index(name='success_rate')
+        confidence_success_df = verified_df.groupby('confidence_bin')['hit'].mean().mul(100).reset_index(name='success_rate')
         
         fig = px.bar(
             confidence_success_df,
@@ -286,16 +394,19 @@ with tab3:
     # Symbol auswählen
     symbol = st.selectbox(
         "Symbol auswählen",
-        options=sorted(technical_df['symbol'].unique())
+        options=load_distinct_values('technical_analysis')
     )
     
-    # Daten für das ausgewählte Symbol filtern
-    symbol_data = technical_df[technical_df['symbol'] == symbol].sort_values('timestamp')
+    # Daten für das ausgewählte Symbol laden
+    symbol_data = load_technical_data(symbol)
     
     if not symbol_data.empty:
         # Technische Indikatoren visualisieren
         st.subheader(f"Technische Indikatoren für {symbol}")
         
+        # Für die Linien genügt eine ausgedünnte Zeitreihe
+        chart_data = downsample(symbol_data)
+        
         # Preischart mit SMAs
         fig = make_subplots(rows=3, cols=1, 
                            shared_xaxes=True, 
@@ -305,24 +416,24 @@ with tab3:
         
         # Preischart
         fig.add_trace(
-            go.Scatter(x=symbol_data['timestamp'], y=symbol_data['close_price'], name='Preis', line=dict(color='blue')),
+            go.Scatter(x=chart_data['timestamp'], y=chart_data['close_price'], name='Preis', line=dict(color='blue')),
             row=1, col=1
         )
         
         # SMAs
         fig.add_trace(
-            go.Scatter(x=symbol_data['timestamp'], y=symbol_data['sma_20'], name='SMA 20', line=dict(color='orange')),
+            go.Scatter(x=chart_data['timestamp'], y=chart_data['sma_20'], name='SMA 20', line=dict(color='orange')),
             row=1, col=1
         )
         
         fig.add_trace(
-            go.Scatter(x=symbol_data['timestamp'], y=symbol_data['sma_50'], name='SMA 50', line=dict(color='green')),
+            go.Scatter(x=chart_data['timestamp'], y=chart_data['sma_50'], name='SMA 50', line=dict(color='green')),
             row=1, col=1
         )
         
         # RSI
         fig.add_trace(
-            go.Scatter(x=symbol_data['timestamp'], y=symbol_data['rsi'], name='RSI', line=dict(color='purple')),
+            go.Scatter(x=chart_data['timestamp'], y=chart_data['rsi'], name='RSI', line=dict(color='purple')),
             row=2, col=1
         )
         
@@ -332,12 +443,12 @@ with tab3:
         
         # MACD
         fig.add_trace(
-            go.Scatter(x=symbol_data['timestamp'], y=symbol_data['macd_line'], name='MACD', line=dict(color='blue')),
+            go.Scatter(x=chart_data['timestamp'], y=chart_data['macd_line'], name='MACD', line=dict(color='blue')),
             row=3, col=1
         )
         
         fig.add_trace(
-            go.Scatter(x=symbol_data['timestamp'], y=symbol_data['signal_line'], name='Signal', line=dict(color='red')),
+            go.Scatter(x=chart_data['timestamp'], y=chart_data['signal_line'], name='Signal', line=dict(color='red')),
             row=3, col=1
         )
         
@@ -388,12 +499,12 @@ with tab4:
     # Symbol auswählen
     symbol = st.selectbox(
         "Symbol auswählen",
-        options=sorted(sentiment_df['symbol'].unique()),
+        options=load_distinct_values('sentiment_results'),
         key="sentiment_symbol"
     )
     
-    # Daten für das ausgewählte Symbol filtern
-    symbol_sentiment = sentiment_df[sentiment_df['symbol'] == symbol].sort_values('timestamp')
+    # Daten für das ausgewählte Symbol laden
+    symbol_sentiment = load_sentiment_data(symbol)
     
     if not symbol_sentiment.empty:
         # Sentiment-Verteilung visualisieren
@@ -419,7 +530,7 @@ with tab4:
         with col2:
             # Sentiment im Zeitverlauf
             fig = px.line(
-                symbol_sentiment,
+                downsample(symbol_sentiment),
                 x='timestamp',
                 y=['positive_score', 'neutral_score', 'negative_score'],
                 title=f'Sentiment-Scores im Zeitverlauf für {symbol}',
@@ -445,16 +556,9 @@ with tab4:
             'confidence': 'Konfidenz'
         }, inplace=True)
         
-        # Farbiges Sentiment
-        def highlight_sentiment(val):
-            if val == 'positive':
-                return 'background-color: rgba(0, 255, 0, 0.2)'
-            elif val == 'negative':
-                return 'background-color: rgba(255, 0, 0, 0.2)'
-            else:
-                return 'background-color: rgba(0, 0, 255, 0.2)'
-        
-        st.dataframe(news_df.style.applymap(highlight_sentiment, subset=['Sentiment']), use_container_width=True)
+        # Farbiges Sentiment, Styles einmal für die ganze Spalte zuordnen
+        sentiment_styles = news_df['Sentiment'].astype(str).map(SENTIMENT_STYLES).fillna(SENTIMENT_STYLES['neutral'])
+        st.dataframe(news_df.style.apply(lambda _: sentiment_styles, subset=['Sentiment']), use_container_width=True)
     else:
         st.info(f"Keine Sentiment-Daten gefunden für {symbol}.")
 
@@ -466,9 +570,9 @@ st.sidebar.info("Dieses Dashboard bietet eine Echtzeit-Übersicht über generier
 st.sidebar.header("System-Status")
 
 # Letzte Aktualisierung
-last_signal = signals_df['timestamp'].max() if not signals_df.empty else None
-last_technical = technical_df['timestamp'].max() if not technical_df.empty else None
-last_sentiment = sentiment_df['timestamp'].max() if not sentiment_df.empty else None
+signal_count, last_signal = load_table_stats('trading_signals')
+_, last_technical = load_table_stats('technical_analysis')
+news_count, last_sentiment = load_table_stats('sentiment_results')
 
 if last_signal:
     st.sidebar.metric("Letztes Signal", last_signal.strftime('%d.%m.%Y %H:%M'))
@@ -481,11 +585,10 @@ if last_sentiment:
 
 # Statistiken
 st.sidebar.header("Statistiken")
-st.sidebar.metric("Anzahl Signale (gesamt)", len(signals_df))
-st.sidebar.metric("Analysierte Symbole", len(signals_df['symbol'].unique()))
+st.sidebar.metric("Anzahl Signale (gesamt)", signal_count)
+st.sidebar.metric("Analysierte Symbole", len(load_distinct_values('trading_signals')))
 
 # Verarbeitete Nachrichten
-news_count = len(sentiment_df)
 st.sidebar.metric("Verarbeitete Nachrichten", news_count)
 
 # Aktualisieren-Button
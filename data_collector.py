@@ -1,8 +1,10 @@
 import yfinance as yf
 import pandas as pd
-import sqlite3
+import contextlib
 import datetime
+import itertools
 import logging
+from db_utils import open_db
 
 # Logger konfigurieren
 logging.basicConfig(
@@ -15,14 +17,17 @@ logger = logging.getLogger('DataCollector')
 class DataCollector:
     def __init__(self, db_path):
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
+        # Autocommit-Modus: Schreibvorgänge werden explizit mit BEGIN IMMEDIATE / COMMIT geklammert
+        self.conn = open_db(db_path, cached_statements=256)
+        self.cur = self.conn.cursor()
+        # Zeitzone der Börse je Symbol, ändert sich nicht und wird nur einmal abgefragt
+        self._exchange_timezones = {}
         self.setup_database()
         logger.info("DataCollector initialized with database at %s", db_path)
         
     def setup_database(self):
         """Erstellt die benötigten Tabellen in der SQLite-Datenbank"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
+        self.cur.execute('''
         CREATE TABLE IF NOT EXISTS market_data (
             timestamp TEXT,
             symbol TEXT,
@@ -34,8 +39,10 @@ class DataCollector:
             PRIMARY KEY (timestamp, symbol)
         )
         ''')
+        # Kursdaten je Symbol über einen Zeitraum lesen (technische Analyse), der Primärschlüssel beginnt mit timestamp
+        self.cur.execute('CREATE INDEX IF NOT EXISTS idx_md_symbol_ts ON market_data(symbol, timestamp)')
         
-        cursor.execute('''
+        self.cur.execute('''
         CREATE TABLE IF NOT EXISTS news_data (
             timestamp TEXT,
             symbol TEXT,
@@ -45,9 +52,41 @@ class DataCollector:
             PRIMARY KEY (timestamp, symbol, url)
         )
         ''')
-        self.conn.commit()
+        # Nachrichten je Symbol zeitlich geordnet finden, ohne den Primärschlüssel (timestamp zuerst) zu durchlaufen
+        self.cur.execute('CREATE INDEX IF NOT EXISTS idx_news_symbol_ts ON news_data(symbol, timestamp)')
+        
+        # Statistiken für den Query-Planer bei Bedarf aktualisieren, damit die Indizes genutzt werden
+        self.cur.execute('PRAGMA optimize')
         logger.info("Database tables created or already exist")
+    
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Klammert einen Schreibvorgang in BEGIN IMMEDIATE / COMMIT und rollt bei Fehlern zurück"""
+        self.cur.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.cur
+        except Exception:
+            self.cur.execute('ROLLBACK')
+            raise
+        self.cur.execute('COMMIT')
+    
+    def _store_market_data(self, symbol, data):
+        """Speichert die Kursdaten eines Symbols gesammelt in einer Transaktion"""
+        # Zeilen spaltenweise aufbereiten und ohne Zwischenliste an executemany übergeben
+        timestamps = data.index.strftime('%Y-%m-%d %H:%M:%S')
+        columns = [
+            data[col].tolist() if col in data.columns else itertools.repeat(None)
+            for col in ('Open', 'High', 'Low', 'Close', 'Volume')
+        ]
+        rows = zip(timestamps, itertools.repeat(symbol), *columns)
         
+        with self._transaction():
+            self.cur.executemany('''
+            INSERT OR REPLACE INTO market_data 
+            (timestamp, symbol, open, high, low, close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+    
     def fetch_market_data(self, symbol, period="1d", interval="1m"):
         """Holt Marktdaten für ein Symbol von Yahoo Finance"""
         try:
@@ -59,29 +98,93 @@ class DataCollector:
             if isinstance(data.columns, pd.MultiIndex):
                 data.columns = ['_'.join(col).strip() for col in data.columns.values]
             
-            # Daten in die Datenbank speichern
-            for timestamp, row in data.iterrows():
-                cursor = self.conn.cursor()
-                cursor.execute('''
-                INSERT OR REPLACE INTO market_data 
-                (timestamp, symbol, open, high, low, close, volume)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    symbol,
-                    row.get('Open', None),
-                    row.get('High', None),
-                    row.get('Low', None),
-                    row.get('Close', None),
-                    row.get('Volume', None)
-                ))
-            self.conn.commit()
+            self._store_market_data(symbol, data)
             logger.info(f"Successfully fetched and stored market data for {symbol}")
             return True
         except Exception as e:
             logger.error(f"Error fetching market data for {symbol}: {str(e)}")
             return False
     
+    def _to_exchange_time(self, symbol, data):
+        """
+        Rechnet den Index der Kursdaten in die Ortszeit der Börse des Symbols um
+        
+        yf.download legt die Kursdaten aller Symbole auf einen gemeinsamen Index. Bei Börsen in
+        verschiedenen Zeitzonen (z. B. ^GDAXI und US-Werte) ist das UTC, die gespeicherten
+        Zeitstempel sind aber wie bei fetch_market_data Börsenortszeit.
+        
+        Args:
+            symbol: Das Symbol
+            data: Kursdaten des Symbols mit zeitzonenbehaftetem Index
+            
+        Returns:
+            Die Kursdaten mit Index in Börsenortszeit
+        """
+        if data.index.tz is None:
+            return data
+        
+        timezone = self._exchange_timezones.get(symbol)
+        if timezone is None:
+            timezone = yf.Ticker(symbol).fast_info['timezone']
+            self._exchange_timezones[symbol] = timezone
+        return data.tz_convert(timezone)
+    
+    def fetch_market_data_batch(self, symbols, period="1d", interval="1m"):
+        """
+        Holt Marktdaten für mehrere Symbole mit einer gebündelten Anfrage von Yahoo Finance
+        
+        Args:
+            symbols: Liste von Symbolen
+            period: Zeitraum der Kursdaten
+            interval: Intervall der Kursdaten
+            
+        Returns:
+            True, wenn die Daten aller Symbole gespeichert wurden, sonst False
+        """
+        try:
+            data = yf.download(
+                tickers=list(symbols),
+                period=period,
+                interval=interval,
+                group_by='ticker',
+                threads=True,
+                auto_adjust=True,
+                progress=False
+            )
+        except Exception as e:
+            logger.error(f"Error fetching market data batch: {str(e)}")
+            return False
+        
+        # Ältere yfinance-Versionen liefern bei nur einem Symbol keinen Multi-Index
+        if not isinstance(data.columns, pd.MultiIndex):
+            data = pd.concat({symbols[0]: data}, axis=1)
+        
+        success = True
+        returned_symbols = set(data.columns.get_level_values(0))
+        for symbol in symbols:
+            if symbol not in returned_symbols:
+                logger.warning(f"No market data returned for {symbol}")
+                success = False
+                continue
+            
+            try:
+                # Zeilen, in denen nur andere Symbole Kurse haben, verwerfen
+                symbol_data = self._to_exchange_time(symbol, data[symbol].dropna(how='all'))
+            except Exception as e:
+                # Ohne bekannte Zeitzone das Symbol einzeln abrufen, das liefert direkt Börsenortszeit
+                logger.warning(f"Could not determine exchange timezone for {symbol}, fetching it separately: {str(e)}")
+                success = self.fetch_market_data(symbol, period, interval) and success
+                continue
+            
+            try:
+                self._store_market_data(symbol, symbol_data)
+                logger.info(f"Successfully fetched and stored market data for {symbol}")
+            except Exception as e:
+                logger.error(f"Error storing market data for {symbol}: {str(e)}")
+                success = False
+        
+        return success
+    
     def fetch_news(self, symbol):
         """Holt Nachrichtendaten für ein Symbol von Yahoo Finance"""
         try:
@@ -89,21 +192,20 @@ class DataCollector:
             news = stock.news
             
             if news:
-                cursor = self.conn.cursor()
-                for item in news:
-                    timestamp = datetime.datetime.fromtimestamp(item.get('providerPublishTime', 0))
-                    cursor.execute('''
-                    INSERT OR IGNORE INTO news_data
-                    (timestamp, symbol, title, summary, url)
-                    VALUES (?, ?, ?, ?, ?)
-                    ''', (
-                        timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                        symbol,
-                        item.get('title', ''),
-                        item.get('summary', ''),
-                        item.get('link', '')
-                    ))
-                self.conn.commit()
+                with self._transaction():
+                    for item in news:
+                        timestamp = datetime.datetime.fromtimestamp(item.get('providerPublishTime', 0))
+                        self.cur.execute('''
+                        INSERT OR IGNORE INTO news_data
+                        (timestamp, symbol, title, summary, url)
+                        VALUES (?, ?, ?, ?, ?)
+                        ''', (
+                            timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                            symbol,
+                            item.get('title', ''),
+                            item.get('summary', ''),
+                            item.get('link', '')
+                        ))
                 logger.info(f"Successfully fetched and stored news for {symbol}")
                 return True
             logger.warning(f"No news found for {symbol}")
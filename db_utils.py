@@ -0,0 +1,33 @@
+import sqlite3
+
+# PRAGMAs für alle Verbindungen zur gemeinsamen Datenbank:
+# WAL, damit Leser und Schreiber sich nicht blockieren, und synchronous=NORMAL,
+# wodurch im WAL-Modus das fsync pro Commit entfällt
+CONNECTION_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA mmap_size=268435456;
+PRAGMA cache_size=-65536;
+"""
+
+def open_db(path, **kwargs):
+    """
+    Öffnet eine SQLite-Verbindung mit den Standard-PRAGMAs des Systems
+
+    Die Verbindung läuft im Autocommit-Modus, Schreibvorgänge mit mehreren
+    Anweisungen müssen explizit mit BEGIN / COMMIT geklammert werden.
+
+    Args:
+        path: Pfad zur SQLite-Datenbank
+        **kwargs: Weitere Argumente für sqlite3.connect
+
+    Returns:
+        Die geöffnete Verbindung
+    """
+    options = {'isolation_level': None, 'check_same_thread': False}
+    options.update(kwargs)
+
+    conn = sqlite3.connect(path, **options)
+    conn.executescript(CONNECTION_PRAGMAS)
+    return conn
@@ -0,0 +1,52 @@
+import os
+import json
+
+# orjson kodiert deutlich schneller als das json-Modul, ist aber keine Pflichtabhängigkeit
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def load_json(path):
+    """
+    Liest eine JSON-Datei
+
+    Args:
+        path: Pfad zur Datei
+
+    Returns:
+        Der gelesene Inhalt
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dump_json(path, obj, indent=False, fsync=False):
+    """
+    Schreibt ein Objekt als JSON-Datei
+
+    Geschrieben wird zuerst in eine temporäre Datei, die anschließend die alte
+    ersetzt, damit ein Absturz keine halb geschriebene Datei hinterlässt.
+
+    Args:
+        path: Pfad zur Datei
+        obj: Das zu speichernde Objekt
+        indent: Mit Einrückung für bessere Lesbarkeit schreiben
+        fsync: Die Daten vor dem Ersetzen auf den Datenträger schreiben, damit die Datei
+               auch nach einem Stromausfall vollständig ist
+    """
+    if orjson is not None:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    else:
+        data = json.dumps(obj, indent=2 if indent else None).encode('utf-8')
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
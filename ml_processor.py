@@ -1,10 +1,15 @@
 import threading
 import signal
+import contextlib
+import hashlib
+import itertools
 import time
 import logging
-import sqlite3
-import json
 import os
+import operator
+import sqlite3
+from db_utils import open_db
+from json_io import load_json, dump_json
 from sentiment_analyzer import FinBERTSentimentAnalyzer
 
 # Logger konfigurieren
@@ -15,19 +20,65 @@ logging.basicConfig(
 )
 logger = logging.getLogger('MLProcessor')
 
+# Pro Datenbankabfrage werden höchstens so viele Batches an Nachrichten geholt
+FETCH_BATCHES_PER_QUERY = 8
+# Reihenfolge der Score-Spalten in sentiment_results und sentiment_cache
+SENTIMENT_LABELS = ('negative', 'neutral', 'positive')
+SCORE_COLUMNS = operator.itemgetter(*SENTIMENT_LABELS)
+# Mindestabstand zwischen zwei Checkpoint-Schreibvorgängen in Sekunden
+CHECKPOINT_INTERVAL = 30
+
+# SQL-Anweisungen als Konstanten, damit jeder Aufruf den Statement-Cache der Verbindung trifft
+SQL_FETCH_NEWS = '''
+SELECT rowid AS id, timestamp, symbol, title, summary, url 
+FROM news_data 
+WHERE rowid > ? 
+ORDER BY rowid
+LIMIT ?
+'''
+
+SQL_UPSERT_SENTIMENT = '''
+INSERT OR REPLACE INTO sentiment_results
+(news_id, symbol, negative_score, neutral_score, positive_score, 
+dominant_sentiment, confidence, timestamp)
+VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
+'''
+
+SQL_LOOKUP_CACHE = '''
+SELECT hash, negative_score, neutral_score, positive_score
+FROM sentiment_cache
+WHERE hash IN ({placeholders})
+'''
+
+SQL_INSERT_CACHE = '''
+INSERT OR IGNORE INTO sentiment_cache (hash, negative_score, neutral_score, positive_score)
+VALUES (?, ?, ?, ?)
+'''
+
 class InterruptibleMLProcessor:
-    def __init__(self, db_path, checkpoint_dir='checkpoints'):
+    def __init__(self, db_path, checkpoint_dir='checkpoints', replica=None, onnx_path=None):
         """
         Initialisiert den unterbrechbaren ML-Prozessor
         
         Args:
             db_path: Pfad zur SQLite-Datenbank
             checkpoint_dir: Verzeichnis für Checkpoints
+            replica: Optionale ReplicaSync, wenn db_path eine lokale Replik ist
+            onnx_path: Optionaler Pfad zum ONNX-Modell für die Inferenz mit ONNX Runtime
         """
         self.db_path = db_path
+        self.replica = replica
         self.checkpoint_dir = checkpoint_dir
         self.checkpoint_file = os.path.join(checkpoint_dir, 'processor_checkpoint.json')
-        self.sentiment_analyzer = FinBERTSentimentAnalyzer(checkpoint_dir=checkpoint_dir)
+        self.sentiment_analyzer = FinBERTSentimentAnalyzer(checkpoint_dir=checkpoint_dir, onnx_path=onnx_path)
+        
+        # Eine Verbindung für die gesamte Laufzeit, der Lock schützt sie vor parallelem Zugriff
+        self._conn = open_db(db_path)
+        # sqlite3.Row erlaubt Zugriff per Spaltenname, ohne pro Zeile ein Dict zu bauen
+        self._conn.row_factory = sqlite3.Row
+        # Ein Cursor für alle Anweisungen, ebenfalls durch den Lock geschützt
+        self._cur = self._conn.cursor()
+        self._db_lock = threading.Lock()
         
         # Pause-Event für unterbrechbare Verarbeitung
         self.pause_event = threading.Event()
@@ -38,11 +89,50 @@ class InterruptibleMLProcessor:
         
         # Checkpoint-Status
         self.current_state = self._load_checkpoint()
+        self._checkpoint_dirty = False
+        self._last_checkpoint_save = 0.0
+        
+        # Ergebnistabelle einmalig anlegen
+        self._create_results_table()
         
         # Signal-Handlers einrichten
         signal.signal(signal.SIGINT, self._handle_interrupt)
         signal.signal(signal.SIGTERM, self._handle_terminate)
     
+    def _create_results_table(self):
+        """Erstellt die Tabellen für Sentiment-Ergebnisse und bereits bewertete Texte in der Datenbank"""
+        try:
+            with self._db_lock:
+                cursor = self._cur
+                
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sentiment_results (
+                    news_id INTEGER PRIMARY KEY,
+                    symbol TEXT,
+                    negative_score REAL,
+                    neutral_score REAL,
+                    positive_score REAL,
+                    dominant_sentiment TEXT,
+                    confidence REAL,
+                    timestamp TEXT
+                )
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_sentiment_ts ON sentiment_results(symbol, timestamp)')
+                
+                # Scores je Text-Hash, damit identische Nachrichten nicht erneut bewertet werden
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sentiment_cache (
+                    hash TEXT PRIMARY KEY,
+                    negative_score REAL,
+                    neutral_score REAL,
+                    positive_score REAL
+                )
+                ''')
+            
+            logger.info("Sentiment results table created or already exists")
+        except Exception as e:
+            logger.error(f"Error creating sentiment results table: {str(e)}")
+    
     def _load_checkpoint(self):
         """Lädt den letzten Checkpoint, falls vorhanden"""
         default_state = {
@@ -52,8 +142,7 @@ class InterruptibleMLProcessor:
         
         if os.path.exists(self.checkpoint_file):
             try:
-                with open(self.checkpoint_file, 'r') as f:
-                    state = json.load(f)
+                state = load_json(self.checkpoint_file)
                 logger.info(f"Loaded checkpoint: {state}")
                 return state
             except Exception as e:
@@ -62,11 +151,22 @@ class InterruptibleMLProcessor:
         logger.info("No checkpoint found, starting fresh")
         return default_state
     
-    def _save_checkpoint(self):
-        """Speichert den aktuellen Zustand als Checkpoint"""
+    def _save_checkpoint(self, force=False):
+        """
+        Speichert den aktuellen Zustand als Checkpoint, sofern er sich geändert hat
+        
+        Args:
+            force: Auch speichern, wenn der letzte Checkpoint jünger als CHECKPOINT_INTERVAL ist
+        """
+        if not self._checkpoint_dirty:
+            return
+        if not force and time.monotonic() - self._last_checkpoint_save < CHECKPOINT_INTERVAL:
+            return
+        
         try:
-            with open(self.checkpoint_file, 'w') as f:
-                json.dump(self.current_state, f)
+            dump_json(self.checkpoint_file, self.current_state)
+            self._checkpoint_dirty = False
+            self._last_checkpoint_save = time.monotonic()
             logger.info(f"Saved checkpoint: {self.current_state}")
         except Exception as e:
             logger.error(f"Error saving checkpoint: {str(e)}")
@@ -82,95 +182,208 @@ class InterruptibleMLProcessor:
         self.pause_event.set()
         self.shutdown_flag.set()
     
-    def fetch_unprocessed_news(self):
-        """Holt unverarbeitete Nachrichten aus der Datenbank"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Nachrichten abrufen, die nach der letzten verarbeiteten ID kommen
-            cursor.execute('''
-            SELECT rowid, timestamp, symbol, title, summary, url 
-            FROM news_data 
-            WHERE rowid > ? 
-            ORDER BY rowid
-            ''', (self.current_state['last_news_id'],))
-            
-            results = []
-            for row in cursor.fetchall():
-                results.append({
-                    'id': row[0],
-                    'timestamp': row[1],
-                    'symbol': row[2],
-                    'title': row[3],
-                    'summary': row[4],
-                    'url': row[5]
-                })
+    def fetch_unprocessed_news(self, limit=None):
+        """
+        Holt unverarbeitete Nachrichten aus der Datenbank
+        
+        Args:
+            limit: Maximale Anzahl an Nachrichten, None für alle
             
-            conn.close()
-            logger.info(f"Fetched {len(results)} unprocessed news items")
-            return results
+        Yields:
+            Nachrichten als sqlite3.Row
+        """
+        try:
+            # Die Zeilen werden vollständig geholt, bevor sie weitergegeben werden: eine noch offene
+            # Abfrage würde den Lese-Snapshot der gemeinsamen Verbindung halten, und das Speichern
+            # der Ergebnisse schlüge fehl, sobald der Collector zwischendurch schreibt.
+            # Der Speicher bleibt durch LIMIT begrenzt (LIMIT -1 = unbegrenzt).
+            with self._db_lock:
+                rows = self._cur.execute(
+                    SQL_FETCH_NEWS, (self.current_state['last_news_id'], -1 if limit is None else limit)
+                ).fetchall()
         except Exception as e:
             logger.error(f"Error fetching unprocessed news: {str(e)}")
-            return []
-    
-    def save_sentiment_results(self, results):
-        """Speichert die Sentiment-Analyseergebnisse in der Datenbank"""
-        if not results:
             return
         
+        logger.info(f"Fetched {len(rows)} unprocessed news items")
+        yield from rows
+    
+    def save_sentiment_results(self, results, last_news_id=None):
+        """
+        Speichert die Sentiment-Analyseergebnisse in der Datenbank
+        
+        Args:
+            results: Liste von Ergebnissen mit Sentiment-Analyse
+            last_news_id: Höchste abgearbeitete Nachrichten-ID, auch wenn für sie kein Ergebnis
+                          entstand (Standard: höchste ID der Ergebnisse)
+        """
+        if last_news_id is None:
+            if not results:
+                return
+            last_news_id = max(r['id'] for r in results)
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Tabelle erstellen, falls sie nicht existiert
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sentiment_results (
-                news_id INTEGER PRIMARY KEY,
-                symbol TEXT,
-                negative_score REAL,
-                neutral_score REAL,
-                positive_score REAL,
-                dominant_sentiment TEXT,
-                confidence REAL,
-                timestamp TEXT
-            )
-            ''')
-            
-            # Ergebnisse speichern
-            for result in results:
-                sentiment = result['sentiment']
-                scores = sentiment['scores']
-                
-                cursor.execute('''
-                INSERT OR REPLACE INTO sentiment_results
-                (news_id, symbol, negative_score, neutral_score, positive_score, 
-                dominant_sentiment, confidence, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
-                ''', (
+            # Zeilen vorab aufbauen und gesammelt einfügen, die Scores mit einem itemgetter-Aufruf je Zeile
+            rows = [
+                (
                     result['id'],
                     result['symbol'],
-                    scores.get('negative', 0.0),
-                    scores.get('neutral', 0.0),
-                    scores.get('positive', 0.0),
-                    sentiment['dominant_sentiment'],
-                    sentiment['confidence']
-                ))
+                    *SCORE_COLUMNS(result['sentiment']['scores']),
+                    result['sentiment']['dominant_sentiment'],
+                    result['sentiment']['confidence']
+                )
+                for result in results
+            ]
             
-            conn.commit()
-            conn.close()
+            # Ergebnisse in einer Transaktion speichern
+            if rows:
+                with self._db_lock:
+                    cursor = self._cur
+                    cursor.execute('BEGIN')
+                    try:
+                        cursor.executemany(SQL_UPSERT_SENTIMENT, rows)
+                    except Exception:
+                        # Die Verbindung bleibt offen, daher keine halbe Transaktion zurücklassen
+                        cursor.execute('ROLLBACK')
+                        raise
+                    cursor.execute('COMMIT')
             
-            # Letzten Status aktualisieren
-            if results:
-                self.current_state['last_news_id'] = max(r['id'] for r in results)
+            # Letzten Status aktualisieren. Er folgt den abgearbeiteten Nachrichten, nicht den Ergebnissen:
+            # liefert ein ganzes Abfragefenster kein Ergebnis, würde es sonst bei jeder Runde erneut geholt
+            if last_news_id > self.current_state['last_news_id']:
+                self.current_state['last_news_id'] = last_news_id
                 self.current_state['last_run'] = time.strftime('%Y-%m-%d %H:%M:%S')
+                # Ein verspäteter Checkpoint ist unkritisch: nach einem Absturz werden die Nachrichten seit dem
+                # letzten gespeicherten Checkpoint erneut analysiert (der Analyzer filtert für den Prozessor nicht)
+                # und ihre Ergebnisse per INSERT OR REPLACE ersetzt
+                self._checkpoint_dirty = True
                 self._save_checkpoint()
             
             logger.info(f"Saved {len(results)} sentiment results to database")
         except Exception as e:
             logger.error(f"Error saving sentiment results: {str(e)}")
     
-    def process(self, batch_size=10):
+    @staticmethod
+    def _text_hash(item):
+        """Liefert den Hash des Textes, den der Analyzer für eine Nachricht bewertet"""
+        return hashlib.sha1(f"{item['title']} {item['summary']}".encode('utf-8')).hexdigest()
+    
+    def _load_cached_scores(self, hashes):
+        """
+        Holt die gespeicherten Scores bereits bewerteter Texte
+        
+        Args:
+            hashes: Text-Hashes der Nachrichten
+            
+        Returns:
+            Dict von Hash auf Scores in der Reihenfolge von SENTIMENT_LABELS
+        """
+        if not hashes:
+            return {}
+        
+        query = SQL_LOOKUP_CACHE.format(placeholders=', '.join('?' * len(hashes)))
+        with self._db_lock:
+            rows = self._cur.execute(query, tuple(hashes)).fetchall()
+        return {row['hash']: tuple(row)[1:] for row in rows}
+    
+    def _store_cached_scores(self, rows):
+        """Speichert die Scores neu bewerteter Texte im Cache"""
+        if not rows:
+            return
+        
+        with self._db_lock:
+            self._cur.execute('BEGIN')
+            try:
+                self._cur.executemany(SQL_INSERT_CACHE, rows)
+            except Exception:
+                self._cur.execute('ROLLBACK')
+                raise
+            self._cur.execute('COMMIT')
+    
+    def analyze_news(self, news_items, batch_size=32):
+        """
+        Analysiert Nachrichten und übernimmt die Ergebnisse für bereits bewertete Texte
+        
+        Dieselbe Nachricht erscheint häufig für mehrere Symbole. Jeder Text wird daher nur einmal
+        an FinBERT gegeben, weitere Vorkommen erhalten eine Kopie des Ergebnisses.
+        
+        Args:
+            news_items: Liste von Nachrichten
+            batch_size: Anzahl der Nachrichten pro Batch
+            
+        Returns:
+            Tupel aus der Liste der Ergebnisse und der höchsten abgearbeiteten Nachrichten-ID
+            (None, wenn wegen einer Pause keine Nachricht abgearbeitet wurde)
+        """
+        if not news_items:
+            return [], None
+        
+        last_news_id = max(item['id'] for item in news_items)
+        hashes = [self._text_hash(item) for item in news_items]
+        try:
+            cached = self._load_cached_scores(set(hashes))
+        except Exception as e:
+            logger.error(f"Error reading sentiment cache: {str(e)}")
+            cached = {}
+        
+        results = []
+        pending = {}  # Hash -> Nachrichten mit diesem noch unbekannten Text
+        for item, text_hash in zip(news_items, hashes):
+            scores = cached.get(text_hash)
+            if scores is None:
+                pending.setdefault(text_hash, []).append(item)
+                continue
+            
+            best = max(range(len(SENTIMENT_LABELS)), key=scores.__getitem__)
+            results.append({
+                'id': item['id'],
+                'symbol': item['symbol'],
+                'sentiment': {
+                    'scores': dict(zip(SENTIMENT_LABELS, scores)),
+                    'dominant_sentiment': SENTIMENT_LABELS[best],
+                    'confidence': scores[best]
+                }
+            })
+        
+        if not pending:
+            return results, last_news_id
+        
+        # Je Text nur die erste Nachricht bewerten
+        first_items = {items[0]['id']: text_hash for text_hash, items in pending.items()}
+        # Der Fortschritt steht im eigenen Checkpoint, der erst nach dem Speichern der Ergebnisse vorrückt.
+        # Der Analyzer filtert daher nicht nach seinem Checkpoint, der ihm vorauslaufen kann.
+        analyzed = self.sentiment_analyzer.process_news_batch((items[0] for items in pending.values()), batch_size,
+                                                              skip_processed=False)
+        
+        cache_rows = []
+        analyzed_hashes = set()
+        for result in analyzed:
+            text_hash = first_items[result['id']]
+            analyzed_hashes.add(text_hash)
+            cache_rows.append((text_hash, *SCORE_COLUMNS(result['sentiment']['scores'])))
+            
+            # Alle Nachrichten mit demselben Text erhalten das Ergebnis
+            for item in pending[text_hash]:
+                results.append({'id': item['id'], 'symbol': item['symbol'], 'sentiment': result['sentiment']})
+        
+        # Bei einer Pause bleiben Texte unbewertet, spätere IDs dürfen dann nicht als verarbeitet gelten
+        if self.pause_event.is_set():
+            skipped_ids = [item['id'] for text_hash, items in pending.items()
+                           if text_hash not in analyzed_hashes for item in items]
+            if skipped_ids:
+                first_skipped = min(skipped_ids)
+                results = [result for result in results if result['id'] < first_skipped]
+                done_ids = [item['id'] for item in news_items if item['id'] < first_skipped]
+                last_news_id = max(done_ids) if done_ids else None
+        
+        try:
+            self._store_cached_scores(cache_rows)
+        except Exception as e:
+            logger.error(f"Error updating sentiment cache: {str(e)}")
+        
+        return results, last_news_id
+    
+    def process(self, batch_size=32):
         """
         Hauptverarbeitungsschleife
         
@@ -183,24 +396,43 @@ class InterruptibleMLProcessor:
             try:
                 # Prüfen, ob Pause aktiv ist
                 if self.pause_event.is_set():
+                    self._save_checkpoint(force=True)
                     logger.info("Processing paused, waiting for resume")
                     time.sleep(5)
                     continue
                 
-                # Unverarbeitete Nachrichten holen
-                news_items = self.fetch_unprocessed_news()
+                # Neue Nachrichten aus der gemeinsamen Datenbank in die Replik holen
+                if self.replica:
+                    self.replica.pull_news()
+                
+                # Unverarbeitete Nachrichten begrenzt holen und batchweise verarbeiten
+                news_stream = self.fetch_unprocessed_news(limit=batch_size * FETCH_BATCHES_PER_QUERY)
+                processed_items = 0
+                
+                with contextlib.closing(news_stream):
+                    while not self.pause_event.is_set():
+                        news_items = list(itertools.islice(news_stream, batch_size))
+                        if not news_items:
+                            break
+                        processed_items += len(news_items)
+                        
+                        # Sentiment-Analyse durchführen, bekannte Texte aus dem Cache übernehmen
+                        results, last_news_id = self.analyze_news(news_items, batch_size)
+                        
+                        # Ergebnisse speichern und den Checkpoint bis zur letzten abgearbeiteten Nachricht vorrücken
+                        if last_news_id is not None:
+                            self.save_sentiment_results(results, last_news_id)
                 
-                if not news_items:
+                # Ergebnisse dieser Runde gesammelt zurückschreiben
+                if self.replica and processed_items:
+                    self.replica.push_results()
+                
+                if not processed_items and not self.pause_event.is_set():
+                    self._save_checkpoint(force=True)
                     logger.info("No new items to process, sleeping for 60 seconds")
                     time.sleep(60)
                     continue
                 
-                # Sentiment-Analyse durchführen
-                results = self.sentiment_analyzer.process_news_batch(news_items, batch_size)
-                
-                # Ergebnisse speichern
-                self.save_sentiment_results(results)
-                
                 # Kurze Pause zwischen Batches
                 time.sleep(1)
             
@@ -225,4 +457,12 @@ class InterruptibleMLProcessor:
         logger.info("Shutting down")
         self.pause_event.set()
         self.shutdown_flag.set()
-        self._save_checkpoint()
+        self._save_checkpoint(force=True)
+        self.sentiment_analyzer.flush_checkpoint()
+        
+        if self.replica:
+            self.replica.push_results()
+            self.replica.close()
+        
+        with self._db_lock:
+            self._conn.close()
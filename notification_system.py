@@ -1,9 +1,9 @@
 import logging
-import json
 import os
 import datetime
 from telegram import Bot, ParseMode
 from telegram.error import TelegramError
+from json_io import load_json, dump_json
 
 # Logger konfigurieren
 logging.basicConfig(
@@ -13,7 +13,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger('NotificationSystem')
 
+# Telegram erlaubt 4096 Zeichen pro Nachricht, etwas Reserve für die Markdown-Auswertung
+MAX_MESSAGE_LENGTH = 4000
+# Trenner zwischen zusammengefassten Signalen
+MESSAGE_SEPARATOR = "\n\n---\n\n"
+
 class TelegramNotifier:
+    # Emoji je Signal-Typ, unbekannte Typen werden wie NEUTRAL dargestellt
+    _EMOJI = {'BUY': '🟢', 'SELL': '🔴', 'NEUTRAL': '⚪️'}
+    
+    # Vorlage für einzelne Signal-Nachrichten
+    _TEMPLATE = (
+        "{emoji} *{symbol}* - {signal_type} Signal\n\n"
+        "*Kurs:* {close_price:.2f} $\n"
+        "*Konfidenz:* {conf}%\n"
+        "*Zeitpunkt:* {timestamp}\n\n"
+        "*Begründung:*\n{reason}\n\n"
+        "#Signal #{symbol} #{tag}"
+    )
+    
+    # Zeile je Signal in der täglichen Zusammenfassung
+    _SUMMARY_LINE = "  • {symbol} (Konfidenz: {conf}%)\n"
+    
     def __init__(self, token, chat_id, config_file='notification_config.json'):
         """
         Initialisiert den Telegram-Notifier
@@ -28,6 +49,8 @@ class TelegramNotifier:
         self.config_file = config_file
         self.bot = Bot(token=token)
         self.config = self._load_config()
+        self._config_dirty = False
+        self._parse_quiet_hours()
         logger.info("TelegramNotifier initialized")
     
     def _load_config(self):
@@ -48,36 +71,44 @@ class TelegramNotifier:
         
         if os.path.exists(self.config_file):
             try:
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
+                config = load_json(self.config_file)
                 logger.info("Config loaded from file")
                 return config
             except Exception as e:
                 logger.error(f"Error loading config: {str(e)}")
         
         # Standardkonfiguration speichern
-        with open(self.config_file, 'w') as f:
-            json.dump(default_config, f, indent=4)
+        dump_json(self.config_file, default_config, indent=True)
         logger.info("Default config created")
         return default_config
     
     def _save_config(self):
         """Speichert die Konfiguration"""
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, f, indent=4)
+            dump_json(self.config_file, self.config, indent=True)
+            self._config_dirty = False
             logger.info("Config saved")
         except Exception as e:
             logger.error(f"Error saving config: {str(e)}")
     
+    def flush_config(self):
+        """Speichert die Konfiguration, falls sie seit dem letzten Speichern geändert wurde"""
+        if self._config_dirty:
+            self._save_config()
+    
+    def _parse_quiet_hours(self):
+        """Parst Beginn und Ende der Ruhezeiten einmalig aus der Konfiguration"""
+        self._quiet_start = datetime.datetime.strptime(self.config['quiet_hours']['start'], '%H:%M').time()
+        self._quiet_end = datetime.datetime.strptime(self.config['quiet_hours']['end'], '%H:%M').time()
+    
     def _is_in_quiet_hours(self):
         """Prüft, ob die aktuelle Zeit in den Ruhezeiten liegt"""
         if not self.config['quiet_hours']['enabled']:
             return False
         
         now = datetime.datetime.now().time()
-        start = datetime.datetime.strptime(self.config['quiet_hours']['start'], '%H:%M').time()
-        end = datetime.datetime.strptime(self.config['quiet_hours']['end'], '%H:%M').time()
+        start = self._quiet_start
+        end = self._quiet_end
         
         # Wenn start > end, dann geht die Ruhezeit über Mitternacht
         if start > end:
@@ -103,26 +134,36 @@ class TelegramNotifier:
         Returns:
             Formatierte Nachricht
         """
-        # Emoji basierend auf Signal-Typ
-        if signal['signal_type'] == 'BUY':
-            emoji = '🟢'
-        elif signal['signal_type'] == 'SELL':
-            emoji = '🔴'
-        else:
-            emoji = '⚪️'
+        signal_type = signal['signal_type']
         
-        # Konfidenz in Prozent
-        confidence_pct = int(signal['confidence'] * 100)
+        return self._TEMPLATE.format(
+            emoji=self._EMOJI.get(signal_type, self._EMOJI['NEUTRAL']),
+            symbol=signal['symbol'],
+            signal_type=signal_type,
+            close_price=signal['close_price'],
+            conf=int(signal['confidence'] * 100),
+            timestamp=signal['timestamp'],
+            reason=signal['reason'],
+            tag=signal_type.lower()
+        )
+    
+    def _get_blocking_reason(self):
+        """
+        Prüft, ob Signale derzeit nicht gesendet werden dürfen
         
-        # Nachricht formatieren
-        message = f"{emoji} *{signal['symbol']}* - {signal['signal_type']} Signal\n\n"
-        message += f"*Kurs:* {signal['close_price']:.2f} $\n"
-        message += f"*Konfidenz:* {confidence_pct}%\n"
-        message += f"*Zeitpunkt:* {signal['timestamp']}\n\n"
-        message += f"*Begründung:*\n{signal['reason']}\n\n"
-        message += f"#Signal #{signal['symbol']} #{signal['signal_type'].lower()}"
-        
-        return message
+        Returns:
+            Der Grund ('quiet hours' oder 'weekend') oder None, wenn gesendet werden darf
+        """
+        if self._is_in_quiet_hours():
+            return 'quiet hours'
+        
+        is_weekend = self._is_weekend()
+        collect_for_monday = self.config['weekends']['collect_for_monday']
+        
+        if is_weekend and not collect_for_monday:
+            return 'weekend'
+        
+        return None
     
     def send_signal(self, signal):
         """
@@ -135,15 +176,9 @@ class TelegramNotifier:
             True, wenn erfolgreich, sonst False
         """
         # Prüfen, ob die Nachricht in den Ruhezeiten oder am Wochenende ist
-        if self._is_in_quiet_hours():
-            logger.info(f"Signal for {signal['symbol']} not sent due to quiet hours")
-            return False
-        
-        is_weekend = self._is_weekend()
-        collect_for_monday = self.config['weekends']['collect_for_monday']
-        
-        if is_weekend and not collect_for_monday:
-            logger.info(f"Signal for {signal['symbol']} not sent due to weekend")
+        reason = self._get_blocking_reason()
+        if reason:
+            logger.info(f"Signal for {signal['symbol']} not sent due to {reason}")
             return False
         
         # Nachricht formatieren und senden
@@ -155,9 +190,9 @@ class TelegramNotifier:
                 parse_mode=ParseMode.MARKDOWN
             )
             
-            # Letzte Benachrichtigung aktualisieren
+            # Letzte Benachrichtigung aktualisieren, gespeichert wird gesammelt über flush_config()
             self.config['last_notification'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self._save_config()
+            self._config_dirty = True
             
             logger.info(f"Signal for {signal['symbol']} sent successfully")
             return True
@@ -165,12 +200,95 @@ class TelegramNotifier:
             logger.error(f"Error sending Telegram message: {str(e)}")
             return False
     
+    def send_signals(self, signals):
+        """
+        Sendet mehrere Signale gesammelt in möglichst wenigen Telegram-Nachrichten
+        
+        Die Signale werden bis zur Längengrenze von Telegram zu einer Nachricht
+        zusammengefasst, statt für jedes Signal eine eigene Anfrage zu senden.
+        
+        Args:
+            signals: Liste von Signalen
+            
+        Returns:
+            Liste der erfolgreich gesendeten Signale
+        """
+        if not signals:
+            return []
+        
+        reason = self._get_blocking_reason()
+        if reason:
+            logger.info(f"{len(signals)} signals not sent due to {reason}")
+            return []
+        
+        # Signale zu Nachrichten unterhalb der Längengrenze zusammenfassen
+        batches = []
+        current_signals, current_length = [], 0
+        for signal in signals:
+            message = self._format_signal_message(signal)
+            added_length = len(message) + (len(MESSAGE_SEPARATOR) if current_signals else 0)
+            if current_signals and current_length + added_length > MAX_MESSAGE_LENGTH:
+                batches.append(current_signals)
+                current_signals, current_length = [], 0
+                added_length = len(message)
+            current_signals.append((signal, message))
+            current_length += added_length
+        if current_signals:
+            batches.append(current_signals)
+        
+        sent = []
+        for batch in batches:
+            try:
+                self.bot.send_message(
+                    chat_id=self.chat_id,
+                    text=MESSAGE_SEPARATOR.join(message for _, message in batch),
+                    parse_mode=ParseMode.MARKDOWN
+                )
+                sent.extend(signal for signal, _ in batch)
+            except TelegramError as e:
+                logger.error(f"Error sending Telegram message: {str(e)}")
+                if len(batch) > 1:
+                    # Einzeln nachsenden, damit eine fehlerhafte Nachricht (z. B. Markdown im Newstitel)
+                    # nur ihr eigenes Signal blockiert
+                    sent.extend(self._send_individually(batch))
+        
+        if sent:
+            # Letzte Benachrichtigung einmal für alle Nachrichten aktualisieren, gespeichert wird über flush_config()
+            self.config['last_notification'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._config_dirty = True
+        
+        logger.info(f"Sent {len(sent)} of {len(signals)} signals in {len(batches)} messages")
+        return sent
+    
+    def _send_individually(self, batch):
+        """
+        Sendet die Signale eines fehlgeschlagenen Sammelversands jeweils als eigene Nachricht
+        
+        Args:
+            batch: Liste von (Signal, formatierte Nachricht)
+            
+        Returns:
+            Liste der erfolgreich gesendeten Signale
+        """
+        sent = []
+        for signal, message in batch:
+            try:
+                self.bot.send_message(
+                    chat_id=self.chat_id,
+                    text=message,
+                    parse_mode=ParseMode.MARKDOWN
+                )
+                sent.append(signal)
+            except TelegramError as e:
+                logger.error(f"Error sending Telegram message for {signal['symbol']}: {str(e)}")
+        return sent
+    
     def send_daily_summary(self, signals):
         """
         Sendet eine tägliche Zusammenfassung der Signale
         
         Args:
-            signals: Liste von Signalen
+            signals: Liste von Signalen, innerhalb eines Typs in Anzeigereihenfolge
             
         Returns:
             True, wenn erfolgreich, sonst False
@@ -178,28 +296,25 @@ class TelegramNotifier:
         if not signals:
             return False
         
-        # Signale nach Typ gruppieren
-        buy_signals = [s for s in signals if s['signal_type'] == 'BUY']
-        sell_signals = [s for s in signals if s['signal_type'] == 'SELL']
-        neutral_signals = [s for s in signals if s['signal_type'] == 'NEUTRAL']
+        # Signale in einem Durchlauf nach Typ gruppieren, die Reihenfolge innerhalb eines Typs bleibt erhalten
+        signals_by_type = {}
+        for signal in signals:
+            signals_by_type.setdefault(signal['signal_type'], []).append(signal)
         
         # Nachricht formatieren
         message = f"*Tägliche Trading-Signal Zusammenfassung*\n\n"
         message += f"📅 *Datum:* {datetime.datetime.now().strftime('%d.%m.%Y')}\n\n"
         
-        # Buy-Signale
-        if buy_signals:
-            message += "🟢 *BUY Signale:*\n"
-            for signal in buy_signals:
-                message += f"  • {signal['symbol']} (Konfidenz: {int(signal['confidence'] * 100)}%)\n"
-            message += "\n"
-        
-        # Sell-Signale
-        if sell_signals:
-            message += "🔴 *SELL Signale:*\n"
-            for signal in sell_signals:
-                message += f"  • {signal['symbol']} (Konfidenz: {int(signal['confidence'] * 100)}%)\n"
-            message += "\n"
+        # Buy- und Sell-Signale
+        for signal_type in ('BUY', 'SELL'):
+            type_signals = signals_by_type.get(signal_type)
+            if type_signals:
+                message += f"{self._EMOJI[signal_type]} *{signal_type} Signale:*\n"
+                message += ''.join(
+                    self._SUMMARY_LINE.format(symbol=signal['symbol'], conf=int(signal['confidence'] * 100))
+                    for signal in type_signals
+                )
+                message += "\n"
         
         # Nachricht senden
         try:
@@ -0,0 +1,338 @@
+import os
+import shutil
+import sqlite3
+import logging
+from db_utils import open_db
+
+# Logger konfigurieren
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename='replica_sync.log'
+)
+logger = logging.getLogger('ReplicaSync')
+
+# Austauschdateien in der Freigabe. Die gemeinsame Datenbank selbst öffnet nur der Raspberry Pi:
+# SQLite unterstützt WAL nicht über Rechnergrenzen oder Netzwerkdateisysteme hinweg.
+NEWS_SNAPSHOT_FILE = 'news_snapshot.db'
+RESULTS_OUTBOX_FILE = 'sentiment_outbox.db'
+
+SQL_CREATE_SENTIMENT_RESULTS = '''
+CREATE TABLE IF NOT EXISTS {schema}.sentiment_results (
+    news_id INTEGER PRIMARY KEY,
+    symbol TEXT,
+    negative_score REAL,
+    neutral_score REAL,
+    positive_score REAL,
+    dominant_sentiment TEXT,
+    confidence REAL,
+    timestamp TEXT
+)
+'''
+
+def _table_exists(conn, schema, table):
+    """Prüft, ob eine Tabelle im angegebenen Schema existiert"""
+    return conn.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+def _replace_file(src, dst):
+    """Kopiert src nach dst, ohne dass Leser von dst je eine halb geschriebene Datei sehen"""
+    tmp_path = dst + '.tmp'
+    shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+def _remove_file(path):
+    """Löscht eine Datei, sofern sie existiert"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class ReplicaSync:
+    def __init__(self, shared_dir, local_db_path):
+        """
+        Hält eine lokale Kopie der Nachrichten aus der gemeinsamen Datenbank aktuell
+
+        Die gemeinsame Datenbank wird nie über die Netzwerkfreigabe geöffnet. Gelesen wird eine
+        Kopie des Nachrichten-Snapshots, den der ReplicaPublisher auf dem Raspberry Pi ablegt,
+        und neue Sentiment-Ergebnisse werden als eigene Datei in die Freigabe gelegt, die der
+        Publisher in die Datenbank übernimmt.
+
+        Args:
+            shared_dir: Verzeichnis der Freigabe mit den Austauschdateien (z. B. auf dem Raspberry Pi)
+            local_db_path: Pfad zur lokalen Replik
+        """
+        self.shared_dir = shared_dir
+        self.local_db_path = local_db_path
+        self.snapshot_path = os.path.join(shared_dir, NEWS_SNAPSHOT_FILE)
+        self.outbox_path = os.path.join(shared_dir, RESULTS_OUTBOX_FILE)
+        # Lokale Arbeitskopien der Austauschdateien
+        self.local_snapshot_path = local_db_path + '.snapshot'
+        self.local_outbox_path = local_db_path + '.outbox'
+        self.conn = open_db(local_db_path)
+        self._create_local_tables()
+        # Snapshot-Stand der letzten Übernahme und höchste bereits in die Outbox gelegte news_id
+        self._snapshot_mtime = None
+        self._merged_result_id = 0
+        self._pushed_result_id = None
+        logger.info(f"ReplicaSync initialized for {shared_dir} -> {local_db_path}")
+
+    def _create_local_tables(self):
+        """Erstellt die Nachrichtentabelle der lokalen Replik"""
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS news_data (
+            timestamp TEXT,
+            symbol TEXT,
+            title TEXT,
+            summary TEXT,
+            url TEXT,
+            PRIMARY KEY (timestamp, symbol, url)
+        )
+        ''')
+
+    def pull_news(self):
+        """
+        Holt alle Nachrichten aus dem Snapshot, die noch nicht in der lokalen Replik sind
+
+        Der Snapshot wird nur kopiert, wenn er sich seit der letzten Übernahme geändert hat.
+        Die rowid wird übernommen, damit die news_id der Ergebnisse in beiden Datenbanken gilt.
+
+        Returns:
+            Anzahl der übernommenen Nachrichten oder None bei Fehler
+        """
+        try:
+            try:
+                mtime = os.stat(self.snapshot_path).st_mtime_ns
+            except FileNotFoundError:
+                logger.warning(f"No news snapshot found at {self.snapshot_path}")
+                return 0
+            if mtime == self._snapshot_mtime:
+                return 0
+
+            # Eine echte Kopie lesen, nicht die Datei in der Freigabe
+            _replace_file(self.snapshot_path, self.local_snapshot_path)
+
+            self.conn.execute('ATTACH DATABASE ? AS snapshot', (self.local_snapshot_path,))
+            try:
+                self.conn.execute('BEGIN')
+                try:
+                    cursor = self.conn.execute('''
+                    INSERT OR IGNORE INTO main.news_data (rowid, timestamp, symbol, title, summary, url)
+                    SELECT id, timestamp, symbol, title, summary, url
+                    FROM snapshot.news_data
+                    WHERE id > (SELECT COALESCE(MAX(rowid), 0) FROM main.news_data)
+                    ORDER BY id
+                    ''')
+                    self.conn.execute('COMMIT')
+                except Exception:
+                    if self.conn.in_transaction:
+                        self.conn.execute('ROLLBACK')
+                    raise
+                merged = self.conn.execute('SELECT merged_result_id FROM snapshot.snapshot_info').fetchone()
+            finally:
+                self.conn.execute('DETACH DATABASE snapshot')
+
+            self._snapshot_mtime = mtime
+            self._merged_result_id = merged[0] if merged else 0
+            logger.info(f"Pulled {cursor.rowcount} news items into local replica")
+            return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error pulling news from snapshot: {str(e)}")
+            return None
+
+    def push_results(self):
+        """
+        Legt alle Sentiment-Ergebnisse, die der Pi laut Snapshot noch nicht übernommen hat,
+        als Outbox-Datei in die Freigabe
+
+        Returns:
+            Anzahl der übertragenen Ergebnisse oder None bei Fehler
+        """
+        try:
+            # Noch keine Ergebnisse verarbeitet
+            if not _table_exists(self.conn, 'main', 'sentiment_results'):
+                return 0
+
+            # Ohne neue Ergebnisse enthält die vorhandene Outbox bereits alles
+            latest = self.conn.execute('SELECT COALESCE(MAX(news_id), 0) FROM main.sentiment_results').fetchone()[0]
+            if latest <= self._merged_result_id or latest == self._pushed_result_id:
+                return 0
+
+            # Outbox lokal aufbauen, in die Freigabe wird nur die fertige Datei kopiert
+            _remove_file(self.local_outbox_path)
+            self.conn.execute('ATTACH DATABASE ? AS outbox', (self.local_outbox_path,))
+            try:
+                self.conn.execute('BEGIN')
+                try:
+                    self.conn.execute(SQL_CREATE_SENTIMENT_RESULTS.format(schema='outbox'))
+                    cursor = self.conn.execute('''
+                    INSERT INTO outbox.sentiment_results
+                    (news_id, symbol, negative_score, neutral_score, positive_score,
+                    dominant_sentiment, confidence, timestamp)
+                    SELECT news_id, symbol, negative_score, neutral_score, positive_score,
+                           dominant_sentiment, confidence, timestamp
+                    FROM main.sentiment_results
+                    WHERE news_id > ?
+                    ''', (self._merged_result_id,))
+                    self.conn.execute('COMMIT')
+                except Exception:
+                    if self.conn.in_transaction:
+                        self.conn.execute('ROLLBACK')
+                    raise
+            finally:
+                self.conn.execute('DETACH DATABASE outbox')
+
+            _replace_file(self.local_outbox_path, self.outbox_path)
+            self._pushed_result_id = latest
+
+            logger.info(f"Pushed {cursor.rowcount} sentiment results to {self.outbox_path}")
+            return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error pushing sentiment results to outbox: {str(e)}")
+            return None
+
+    def close(self):
+        """Schließt die lokale Verbindung"""
+        self.conn.close()
+
+class ReplicaPublisher:
+    def __init__(self, db_path, shared_dir=None):
+        """
+        Gegenstück zu ReplicaSync auf dem Raspberry Pi, dem einzigen Rechner mit Zugriff auf die Datenbank
+
+        Legt neue Nachrichten als Snapshot-Datei in die Freigabe und übernimmt die Outbox mit den
+        Sentiment-Ergebnissen des ML-Prozessors in die Datenbank.
+
+        Args:
+            db_path: Pfad zur gemeinsamen Datenbank
+            shared_dir: Verzeichnis der Freigabe (Standard: Verzeichnis der Datenbank)
+        """
+        self.db_path = db_path
+        self.shared_dir = shared_dir or os.path.dirname(os.path.abspath(db_path))
+        self.snapshot_path = os.path.join(self.shared_dir, NEWS_SNAPSHOT_FILE)
+        self.outbox_path = os.path.join(self.shared_dir, RESULTS_OUTBOX_FILE)
+        self.conn = open_db(db_path)
+        # Stand des letzten Snapshots (höchste Nachricht, übernommene Ergebnisse) und der letzten Outbox
+        self._published_state = None
+        self._outbox_mtime = None
+        logger.info(f"ReplicaPublisher initialized for {db_path} -> {self.shared_dir}")
+
+    def merge_results(self):
+        """
+        Übernimmt die Ergebnisse aus der Outbox, sofern sie sich seit der letzten Übernahme geändert hat
+
+        Returns:
+            Anzahl der übernommenen Ergebnisse oder None bei Fehler
+        """
+        try:
+            try:
+                mtime = os.stat(self.outbox_path).st_mtime_ns
+            except FileNotFoundError:
+                return 0
+            if mtime == self._outbox_mtime:
+                return 0
+
+            self.conn.execute('ATTACH DATABASE ? AS outbox', (self.outbox_path,))
+            try:
+                self.conn.execute('BEGIN')
+                try:
+                    self.conn.execute(SQL_CREATE_SENTIMENT_RESULTS.format(schema='main'))
+                    # Der Signal-Generator liest die neuesten Ergebnisse je Symbol
+                    self.conn.execute('CREATE INDEX IF NOT EXISTS idx_sentiment_ts ON sentiment_results(symbol, timestamp)')
+                    cursor = self.conn.execute('''
+                    INSERT OR REPLACE INTO main.sentiment_results
+                    (news_id, symbol, negative_score, neutral_score, positive_score,
+                    dominant_sentiment, confidence, timestamp)
+                    SELECT news_id, symbol, negative_score, neutral_score, positive_score,
+                           dominant_sentiment, confidence, timestamp
+                    FROM outbox.sentiment_results
+                    ''')
+                    self.conn.execute('COMMIT')
+                except Exception:
+                    if self.conn.in_transaction:
+                        self.conn.execute('ROLLBACK')
+                    raise
+            finally:
+                self.conn.execute('DETACH DATABASE outbox')
+
+            self._outbox_mtime = mtime
+            logger.info(f"Merged {cursor.rowcount} sentiment results from {self.outbox_path}")
+            return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error merging sentiment results: {str(e)}")
+            return None
+
+    def publish_news_snapshot(self):
+        """
+        Schreibt die noch nicht bewerteten Nachrichten als Snapshot-Datei in die Freigabe
+
+        Der Snapshot beginnt nach der höchsten übernommenen news_id, ältere Nachrichten hat der
+        ML-Prozessor bereits bewertet. Mit ihr erfährt ReplicaSync, welche Ergebnisse angekommen sind.
+
+        Returns:
+            Anzahl der Nachrichten im Snapshot oder None bei Fehler
+        """
+        try:
+            merged_result_id = 0
+            if _table_exists(self.conn, 'main', 'sentiment_results'):
+                merged_result_id = self.conn.execute(
+                    'SELECT COALESCE(MAX(news_id), 0) FROM sentiment_results'
+                ).fetchone()[0]
+            latest_news_id = self.conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM news_data').fetchone()[0]
+
+            # Unverändert seit dem letzten Snapshot
+            state = (latest_news_id, merged_result_id)
+            if state == self._published_state and os.path.exists(self.snapshot_path):
+                return 0
+
+            tmp_path = self.snapshot_path + '.tmp'
+            _remove_file(tmp_path)
+            self.conn.execute('ATTACH DATABASE ? AS snapshot', (tmp_path,))
+            try:
+                self.conn.execute('BEGIN')
+                try:
+                    self.conn.execute('''
+                    CREATE TABLE snapshot.news_data (
+                        id INTEGER PRIMARY KEY,
+                        timestamp TEXT,
+                        symbol TEXT,
+                        title TEXT,
+                        summary TEXT,
+                        url TEXT
+                    )
+                    ''')
+                    self.conn.execute('CREATE TABLE snapshot.snapshot_info (merged_result_id INTEGER)')
+                    self.conn.execute('INSERT INTO snapshot.snapshot_info VALUES (?)', (merged_result_id,))
+                    cursor = self.conn.execute('''
+                    INSERT INTO snapshot.news_data (id, timestamp, symbol, title, summary, url)
+                    SELECT rowid, timestamp, symbol, title, summary, url
+                    FROM main.news_data
+                    WHERE rowid > ?
+                    ORDER BY rowid
+                    ''', (merged_result_id,))
+                    self.conn.execute('COMMIT')
+                except Exception:
+                    if self.conn.in_transaction:
+                        self.conn.execute('ROLLBACK')
+                    raise
+            finally:
+                self.conn.execute('DETACH DATABASE snapshot')
+
+            os.replace(tmp_path, self.snapshot_path)
+            self._published_state = state
+
+            logger.info(f"Published {cursor.rowcount} news items to {self.snapshot_path}")
+            return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error publishing news snapshot: {str(e)}")
+            return None
+
+    def sync(self):
+        """Übernimmt zuerst die Outbox, damit der neue Snapshot die übernommenen Ergebnisse kennt"""
+        self.merge_results()
+        self.publish_news_snapshot()
+
+    def close(self):
+        """Schließt die Verbindung zur Datenbank"""
+        self.conn.close()
@@ -0,0 +1,42 @@
+import logging
+import argparse
+import run_collector
+import run_technical_analysis
+import run_signal_generator
+import run_notifier
+import run_maintenance
+from scheduler_loop import run_scheduler
+
+# Logger konfigurieren
+# force=True, weil die importierten Module bereits eigene Log-Dateien konfiguriert haben
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename='trading_system.log',
+    force=True
+)
+logger = logging.getLogger('TradingSystem')
+
+# Komponenten, die in diesem Prozess laufen und vom Monitor nicht neu gestartet werden dürfen
+EMBEDDED_COMPONENTS = ('data_collector', 'technical_analyzer', 'signal_generator', 'notifier')
+
+def main():
+    """Startet alle Komponenten mit einem gemeinsamen Scheduler in einem Prozess"""
+    # Argumente parsen
+    parser = argparse.ArgumentParser(description='Trading Signal System')
+    run_maintenance.add_arguments(parser)
+    args = parser.parse_args()
+    
+    # Jobs in derselben Reihenfolge wie in startup.sh einplanen und initial ausführen
+    run_collector.start()
+    run_technical_analysis.start()
+    run_signal_generator.start()
+    run_notifier.start()
+    run_maintenance.start(args, EMBEDDED_COMPONENTS)
+    
+    # Hauptschleife
+    logger.info("Starting combined scheduler")
+    run_scheduler(logger)
+
+if __name__ == "__main__":
+    main()
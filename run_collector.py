@@ -1,7 +1,10 @@
 import schedule
 import time
 import logging
+import threading
 from data_collector import DataCollector
+from replica_sync import ReplicaPublisher
+from scheduler_loop import run_scheduler
 
 # Logger konfigurieren
 logging.basicConfig(
@@ -15,41 +18,85 @@ logger = logging.getLogger('CollectorScheduler')
 STOCK_SYMBOLS = ['AAPL', 'MSFT', 'AMZN', 'GOOGL', 'META', 'TSLA', 'NVDA']
 INDEX_SYMBOLS = ['^GSPC', '^DJI', '^IXIC', '^GDAXI'] # S&P 500, Dow Jones, NASDAQ, DAX
 
+# Nachrichtenanfragen: im Mittel eine pro Sekunde, bis zu fünf direkt hintereinander
+NEWS_REQUESTS_PER_SECOND = 1.0
+NEWS_BURST = 5
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        """
+        Einfacher Token-Bucket zur Begrenzung der API-Anfragen
+        
+        Args:
+            rate: Nachgefüllte Tokens pro Sekunde
+            capacity: Maximale Anzahl gesammelter Tokens
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Nimmt ein Token und wartet nur, wenn der Bucket leer ist"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            
+            if self.tokens < 1:
+                time.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1
+                self.updated = time.monotonic()
+            
+            self.tokens -= 1
+
 # DataCollector initialisieren
 collector = DataCollector('market_data.db')
+news_bucket = TokenBucket(NEWS_REQUESTS_PER_SECOND, NEWS_BURST)
+# Austausch mit dem ML-Prozessor über Dateien in der Freigabe statt Zugriff auf die Datenbank per SMB
+replica_publisher = ReplicaPublisher('market_data.db')
 
 def collect_market_data():
     """Sammelt Marktdaten für alle definierten Symbole"""
     logger.info("Starting market data collection job")
-    for symbol in STOCK_SYMBOLS + INDEX_SYMBOLS:
-        collector.fetch_market_data(symbol, period="1d", interval="1m")
-        time.sleep(1)  # Pause, um API-Limits zu respektieren
+    # Alle Symbole mit einer gebündelten Anfrage abrufen
+    collector.fetch_market_data_batch(STOCK_SYMBOLS + INDEX_SYMBOLS, period="1d", interval="1m")
     logger.info("Market data collection job completed")
 
 def collect_news_data():
     """Sammelt Nachrichtendaten für alle definierten Aktien-Symbole"""
     logger.info("Starting news collection job")
     for symbol in STOCK_SYMBOLS:  # Nur für einzelne Aktien, nicht für Indizes
+        news_bucket.acquire()  # Wartet nur, wenn das API-Limit ausgeschöpft ist
         collector.fetch_news(symbol)
-        time.sleep(1)  # Pause, um API-Limits zu respektieren
     logger.info("News collection job completed")
 
-# Zeitplan für die Datensammlung definieren
-# Marktdaten alle 5 Minuten während der Handelszeiten sammeln
-schedule.every(5).minutes.do(collect_market_data)
-# Nachrichten stündlich sammeln
-schedule.every(60).minutes.do(collect_news_data)
-
-# Initiale Datensammlung starten
-collect_market_data()
-collect_news_data()
-
-# Hauptschleife für den Scheduler
-logger.info("Starting scheduler main loop")
-while True:
-    try:
-        schedule.run_pending()
-        time.sleep(1)
-    except Exception as e:
-        logger.error(f"Error in scheduler main loop: {str(e)}")
-        time.sleep(60)  # Bei Fehler 60 Sekunden warten
+def sync_replica():
+    """Übernimmt die Sentiment-Ergebnisse des ML-Prozessors und veröffentlicht neue Nachrichten"""
+    replica_publisher.sync()
+
+def start():
+    """Plant die Sammel-Jobs ein und führt die initiale Datensammlung durch"""
+    # Zeitplan für die Datensammlung definieren
+    # Marktdaten alle 5 Minuten während der Handelszeiten sammeln
+    schedule.every(5).minutes.do(collect_market_data)
+    # Nachrichten stündlich sammeln
+    schedule.every(60).minutes.do(collect_news_data)
+    # Austauschdateien für den ML-Prozessor jede Minute abgleichen
+    schedule.every(1).minutes.do(sync_replica)
+    
+    # Initiale Datensammlung starten
+    collect_market_data()
+    collect_news_data()
+    sync_replica()
+
+def main():
+    start()
+    
+    # Hauptschleife für den Scheduler
+    logger.info("Starting scheduler main loop")
+    run_scheduler(logger)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 import schedule
-import time
 import logging
 import argparse
 from backup_system import BackupSystem
 from system_monitor import SystemMonitor
+from scheduler_loop import run_scheduler
 
 # Logger konfigurieren
 logging.basicConfig(
@@ -13,19 +13,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger('Maintenance')
 
-def main():
-    # Argumente parsen
-    parser = argparse.ArgumentParser(description='Trading Signal System Maintenance')
+def add_arguments(parser):
+    """Fügt die Argumente für Backup und Monitoring hinzu"""
     parser.add_argument('--email', required=True, help='pCloud Email')
     parser.add_argument('--password', required=True, help='pCloud Password')
     parser.add_argument('--db-path', default='market_data.db', help='Path to SQLite database')
     parser.add_argument('--scripts-dir', default='.', help='Directory containing Python scripts')
     parser.add_argument('--backup-dir', default='backups', help='Directory for local backups')
-    args = parser.parse_args()
+
+def start(args, embedded_components=()):
+    """
+    Plant Backup und Monitoring ein und führt das initiale Monitoring durch
     
+    Args:
+        args: Geparste Argumente aus add_arguments
+        embedded_components: Komponenten, die im selben Prozess laufen und nicht überwacht werden müssen
+    """
     # Backup-System und Monitor initialisieren
     backup_system = BackupSystem(args.email, args.password, args.backup_dir, args.db_path)
-    system_monitor = SystemMonitor(args.db_path, args.scripts_dir)
+    system_monitor = SystemMonitor(args.db_path, args.scripts_dir, embedded_components)
     
     # Funktionen für Schedule definieren
     def run_backup():
@@ -44,16 +50,18 @@ def main():
     
     # Initiales Monitoring durchführen
     run_monitoring()
+
+def main():
+    # Argumente parsen
+    parser = argparse.ArgumentParser(description='Trading Signal System Maintenance')
+    add_arguments(parser)
+    args = parser.parse_args()
+    
+    start(args)
     
     # Hauptschleife
     logger.info("Starting maintenance scheduler")
-    while True:
-        try:
-            schedule.run_pending()
-            time.sleep(60)
-        except Exception as e:
-            logger.error(f"Error in maintenance scheduler: {str(e)}")
-            time.sleep(300)  # Bei Fehler 5 Minuten warten
+    run_scheduler(logger, error_sleep=300)  # Bei Fehler 5 Minuten warten
 
 if __name__ == "__main__":
     main()
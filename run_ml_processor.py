@@ -1,22 +1,35 @@
 import os
 import sys
 import time
+import argparse
 from ml_processor import InterruptibleMLProcessor
+from replica_sync import ReplicaSync
 
 def main():
+    # Argumente parsen
+    parser = argparse.ArgumentParser(description='Trading Signal System ML Processor')
+    parser.add_argument('--batch-size', type=int, default=32, help='News items per FinBERT batch')
+    parser.add_argument('--onnx-path', default=None, help='Run FinBERT with ONNX Runtime from this model file (exported if missing)')
+    args = parser.parse_args()
+    
     print("Starting ML Processor")
     
     # Pfade konfigurieren
-    # Achtung: Pfad zur gemeinsamen Datenbank anpassen!
-    db_path = "\\\\RaspberryPi\\shared\\market_data.db"  # Netzwerkpfad zur Datenbank
+    # Achtung: Pfad zur Freigabe anpassen!
+    shared_dir = "\\\\RaspberryPi\\shared"  # Netzwerkpfad zur Freigabe mit Snapshot und Outbox
+    # Gelesen und geschrieben wird lokal, die gemeinsame Datenbank öffnet nur der Raspberry Pi
+    db_path = os.path.join("data", "market_data_replica.db")
     checkpoint_dir = "checkpoints"
     
-    # Prozessor initialisieren
-    processor = InterruptibleMLProcessor(db_path, checkpoint_dir)
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    
+    # Replik und Prozessor initialisieren
+    replica = ReplicaSync(shared_dir, db_path)
+    processor = InterruptibleMLProcessor(db_path, checkpoint_dir, replica=replica, onnx_path=args.onnx_path)
     
     try:
         # Verarbeitung starten
-        processor.process(batch_size=10)
+        processor.process(batch_size=args.batch_size)
     except KeyboardInterrupt:
         print("Keyboard interrupt received")
     finally:
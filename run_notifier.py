@@ -1,10 +1,11 @@
 import schedule
-import time
 import logging
 import datetime
 import sqlite3
+from db_utils import open_db
 from signal_generator import SignalGenerator
 from notification_system import TelegramNotifier
+from scheduler_loop import run_scheduler
 
 # Logger konfigurieren
 logging.basicConfig(
@@ -34,10 +35,12 @@ def send_notifications():
         logger.info("No new signals to notify")
         return
     
-    # Signale senden und als benachrichtigt markieren
-    for signal in signals:
-        if notifier.send_signal(signal):
-            generator.mark_as_notified(signal['id'])
+    # Signale gesammelt senden und die gesendeten als benachrichtigt markieren
+    sent = notifier.send_signals(signals)
+    generator.mark_signals_as_notified([signal['id'] for signal in sent])
+    
+    # Geänderte Konfiguration einmal pro Lauf speichern
+    notifier.flush_config()
     
     logger.info(f"Notification job completed for {len(signals)} signals")
 
@@ -46,33 +49,26 @@ def send_daily_summary():
     logger.info("Starting daily summary job")
     
     # Signale des heutigen Tages aus der Datenbank holen
+    # Bereichsabfrage statt LIKE, damit der Index auf timestamp genutzt wird
     try:
-        today = datetime.datetime.now().strftime('%Y-%m-%d')
-        conn = sqlite3.connect(DB_PATH)
+        today = datetime.date.today()
+        tomorrow = today + datetime.timedelta(days=1)
+        conn = open_db(DB_PATH)
+        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
+        # Nur die Spalten der Zusammenfassung, nach Typ und Konfidenz bereits von SQLite sortiert
         cursor.execute('''
-        SELECT id, symbol, timestamp, signal_type, confidence, close_price, reason
+        SELECT symbol, signal_type, confidence
         FROM trading_signals
-        WHERE timestamp LIKE ?
-        ORDER BY timestamp DESC
-        ''', (f'{today}%',))
+        WHERE timestamp >= ? AND timestamp < ?
+        ORDER BY signal_type, confidence DESC
+        ''', (today.isoformat(), tomorrow.isoformat()))
         
-        rows = cursor.fetchall()
+        # Zeilen direkt weiterreichen, sqlite3.Row unterstützt den Zugriff per Spaltenname
+        signals = cursor.fetchall()
         conn.close()
         
-        signals = []
-        for row in rows:
-            signals.append({
-                'id': row[0],
-                'symbol': row[1],
-                'timestamp': row[2],
-                'signal_type': row[3],
-                'confidence': row[4],
-                'close_price': row[5],
-                'reason': row[6]
-            })
-        
         if signals:
             notifier.send_daily_summary(signals)
             logger.info(f"Daily summary sent for {len(signals)} signals")
@@ -82,21 +78,23 @@ def send_daily_summary():
     except Exception as e:
         logger.error(f"Error sending daily summary: {str(e)}")
 
-# Zeitplan für Benachrichtigungen definieren
-# Alle 5 Minuten während der Handelszeiten prüfen
-schedule.every(5).minutes.do(send_notifications)
-# Tägliche Zusammenfassung um 18:00 Uhr senden
-schedule.every().day.at("18:00").do(send_daily_summary)
+def start():
+    """Plant die Benachrichtigungs-Jobs ein und sendet initial offene Signale"""
+    # Zeitplan für Benachrichtigungen definieren
+    # Alle 5 Minuten während der Handelszeiten prüfen
+    schedule.every(5).minutes.do(send_notifications)
+    # Tägliche Zusammenfassung um 18:00 Uhr senden
+    schedule.every().day.at("18:00").do(send_daily_summary)
+    
+    # Initiale Benachrichtigung senden
+    send_notifications()
 
-# Initiale Benachrichtigung senden
-send_notifications()
+def main():
+    start()
+    
+    # Hauptschleife für den Scheduler
+    logger.info("Starting notification scheduler")
+    run_scheduler(logger)
 
-# Hauptschleife für den Scheduler
-logger.info("Starting notification scheduler")
-while True:
-    try:
-        schedule.run_pending()
-        time.sleep(1)
-    except Exception as e:
-        logger.error(f"Error in scheduler: {str(e)}")
-        time.sleep(60)  # Bei Fehler 60 Sekunden warten
+if __name__ == "__main__":
+    main()
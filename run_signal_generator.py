@@ -1,7 +1,7 @@
 import schedule
-import time
 import logging
 from signal_generator import SignalGenerator
+from scheduler_loop import run_scheduler
 
 # Logger konfigurieren
 logging.basicConfig(
@@ -25,19 +25,21 @@ def generate_signals():
     generator.save_signals(signals)
     logger.info(f"Signal generation job completed with {len(signals)} signals")
 
-# Zeitplan für die Signalgenerierung definieren
-# Während der Handelszeiten alle 30 Minuten ausführen
-schedule.every(30).minutes.do(generate_signals)
+def start():
+    """Plant die Signalgenerierung ein und führt sie initial aus"""
+    # Zeitplan für die Signalgenerierung definieren
+    # Während der Handelszeiten alle 30 Minuten ausführen
+    schedule.every(30).minutes.do(generate_signals)
+    
+    # Initiale Signalgenerierung starten
+    generate_signals()
 
-# Initiale Signalgenerierung starten
-generate_signals()
+def main():
+    start()
+    
+    # Hauptschleife für den Scheduler
+    logger.info("Starting signal generator scheduler")
+    run_scheduler(logger)
 
-# Hauptschleife für den Scheduler
-logger.info("Starting signal generator scheduler")
-while True:
-    try:
-        schedule.run_pending()
-        time.sleep(1)
-    except Exception as e:
-        logger.error(f"Error in scheduler: {str(e)}")
-        time.sleep(60)  # Bei Fehler 60 Sekunden warten
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import schedule
-import time
 import logging
 from technical_analyzer import TechnicalAnalyzer
+from scheduler_loop import run_scheduler
 
 # Logger konfigurieren
 logging.basicConfig(
@@ -21,26 +21,26 @@ analyzer = TechnicalAnalyzer('market_data.db')
 def run_analysis():
     """Führt die technische Analyse für alle Symbole durch"""
     logger.info("Starting technical analysis job")
-    for symbol in STOCK_SYMBOLS + INDEX_SYMBOLS:
-        results = analyzer.analyze_symbol(symbol)
-        if results:
-            analyzer.save_analysis_results(results)
-        time.sleep(1)  # Kurze Pause zwischen Analysen
+    # Marktdaten aller Symbole in einer Abfrage holen, gespeichert wird gesammelt in einer Transaktion
+    results_list = analyzer.analyze_batch(STOCK_SYMBOLS + INDEX_SYMBOLS)
+    analyzer.save_all_analysis_results(results_list)
     logger.info("Technical analysis job completed")
 
-# Zeitplan für die Analyse definieren
-# Alle 15 Minuten während der Handelszeiten ausführen
-schedule.every(15).minutes.do(run_analysis)
+def start():
+    """Plant die technische Analyse ein und führt sie initial aus"""
+    # Zeitplan für die Analyse definieren
+    # Alle 15 Minuten während der Handelszeiten ausführen
+    schedule.every(15).minutes.do(run_analysis)
+    
+    # Initiale Analyse starten
+    run_analysis()
 
-# Initiale Analyse starten
-run_analysis()
+def main():
+    start()
+    
+    # Hauptschleife für den Scheduler
+    logger.info("Starting technical analysis scheduler")
+    run_scheduler(logger)
 
-# Hauptschleife für den Scheduler
-logger.info("Starting technical analysis scheduler")
-while True:
-    try:
-        schedule.run_pending()
-        time.sleep(1)
-    except Exception as e:
-        logger.error(f"Error in scheduler: {str(e)}")
-        time.sleep(60)  # Bei Fehler 60 Sekunden warten
+if __name__ == "__main__":
+    main()
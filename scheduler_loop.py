@@ -0,0 +1,29 @@
+import time
+import schedule
+
+# Gemeinsame Hauptschleife aller Scheduler (Analyse, Signale, Notifier, Wartung mit dem SystemMonitor).
+# Zwischen den Jobs schläft der Prozess bis zum nächsten fälligen Lauf (schedule.idle_seconds),
+# höchstens 60 Sekunden am Stück, statt run_pending() in einer Schleife ohne Pause aufzurufen.
+
+def run_scheduler(logger, error_sleep=60):
+    """
+    Führt die eingeplanten Jobs aus, bis keine mehr übrig sind
+
+    Geschlafen wird jeweils bis zum nächsten fälligen Job statt in festen Abständen.
+
+    Args:
+        logger: Logger des aufrufenden Schedulers
+        error_sleep: Wartezeit in Sekunden nach einem Fehler
+    """
+    while True:
+        try:
+            idle = schedule.idle_seconds()
+            if idle is None:
+                logger.warning("No scheduled jobs left, stopping scheduler")
+                break
+            if idle > 0:
+                time.sleep(min(idle, 60))
+            schedule.run_pending()
+        except Exception as e:
+            logger.error(f"Error in scheduler: {str(e)}")
+            time.sleep(error_sleep)
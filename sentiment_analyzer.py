@@ -1,9 +1,23 @@
+import os
+
+# Der Rust-Tokenizer verteilt gemeinsam tokenisierte Texte auf mehrere Threads
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'true')
+
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import numpy as np
 import logging
-import json
-import os
+import itertools
+import queue
+import threading
+from collections import OrderedDict
+from json_io import load_json, dump_json
+
+# ONNX Runtime ist optional und wird nur genutzt, wenn ein ONNX-Pfad angegeben ist
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
 
 # Logger konfigurieren
 logging.basicConfig(
@@ -13,18 +27,49 @@ logging.basicConfig(
 )
 logger = logging.getLogger('SentimentAnalyzer')
 
+# Obergrenze für gepaddete Tokens (Sequenzen × längste Sequenz) je Forward-Pass
+TOKEN_BUDGET = 8192
+# Pro Fenster werden höchstens so viele Batches an Nachrichten gelesen und nach Länge gruppiert
+STREAM_WINDOW_BATCHES = 8
+# CUDA Graphs lohnen sich nur bei kurzen Sequenzen, bei denen der Kernel-Start die Laufzeit dominiert
+CUDA_GRAPH_MAX_SEQ_LEN = 128
+# Für CUDA Graphs werden die Eingaben auf feste Formen aufgefüllt, damit wenige Graphen immer wieder
+# verwendet werden: Sequenzlänge auf ein Vielfaches von CUDA_GRAPH_SEQ_BUCKET, Batchgröße auf die
+# nächste Stufe aus CUDA_GRAPH_BATCH_BUCKETS (größere Batches laufen ohne Graph)
+CUDA_GRAPH_SEQ_BUCKET = 32
+CUDA_GRAPH_BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+# Anzahl der aufgezeichneten Graphen (je Eingabeform), reicht für alle Formen aus den Stufen
+CUDA_GRAPH_CACHE_SIZE = len(CUDA_GRAPH_BATCH_BUCKETS) * (CUDA_GRAPH_MAX_SEQ_LEN // CUDA_GRAPH_SEQ_BUCKET)
+
 class FinBERTSentimentAnalyzer:
-    def __init__(self, model_path=None, checkpoint_dir='checkpoints'):
+    def __init__(self, model_path=None, checkpoint_dir='checkpoints', quantize=True, half_precision=True,
+                 onnx_path=None, cuda_graphs=True):
         """
         Initialisiert den FinBERT-basierten Sentiment-Analyzer
         
         Args:
             model_path: Pfad zum vortrainierten Modell, wenn None wird 'yiyanghkust/finbert-tone' verwendet
             checkpoint_dir: Verzeichnis für Checkpoints
+            quantize: Auf der CPU die linearen Schichten dynamisch auf int8 quantisieren
+            half_precision: Auf der GPU mit FP16-Gewichten rechnen
+            onnx_path: Pfad zum ONNX-Modell für ONNX Runtime, wird beim ersten Start exportiert;
+                       None verwendet PyTorch für die Inferenz
+            cuda_graphs: Auf der GPU den Forward-Pass kurzer Sequenzen je Eingabeform als CUDA Graph
+                         aufzeichnen und wiederholen
         """
         self.checkpoint_dir = checkpoint_dir
         self.checkpoint_file = os.path.join(checkpoint_dir, 'sentiment_checkpoint.json')
         self.current_state = {'last_processed_id': 0}
+        # Pause-Event, wird über set_interruptible gesetzt
+        self.pause_event = None
+        # Zuletzt zum Speichern übergebene ID, damit unveränderte Checkpoints nicht erneut geschrieben werden
+        self._last_saved_id = -1
+        
+        # Checkpoints schreibt ein Hintergrund-Thread, damit die Inferenz nicht auf fsync wartet;
+        # die Queue hält nur den neuesten noch nicht geschriebenen Zustand
+        self._ckpt_slot = queue.Queue(maxsize=1)
+        self._ckpt_thread = threading.Thread(target=self._ckpt_worker, name='checkpoint-writer', daemon=True)
+        self._ckpt_thread.start()
         
         # Checkpoints-Verzeichnis erstellen, falls es nicht existiert
         if not os.path.exists(checkpoint_dir):
@@ -37,26 +82,120 @@ class FinBERTSentimentAnalyzer:
         logger.info("Loading FinBERT model and tokenizer")
         model_name = model_path if model_path else 'yiyanghkust/finbert-tone'
         try:
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            # Nur der schnelle Rust-Tokenizer, der langsame Python-Tokenizer würde die Batches ausbremsen
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+            if not self.tokenizer.is_fast:
+                raise RuntimeError(f"No fast tokenizer available for {model_name}, install the 'tokenizers' package")
             self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
             
             # Wenn GPU verfügbar ist, das Modell auf die GPU verschieben
             self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
             self.model.to(self.device)
+            self.model.eval()
+            
+            # ONNX Runtime fasst Attention, LayerNorm und GELU zu eigenen Kerneln zusammen
+            self.session = self._load_onnx_session(onnx_path) if onnx_path else None
+            if self.session is not None:
+                quantize = half_precision = False
+            
+            # Auf der CPU dominieren die linearen Schichten die Laufzeit, int8-Gewichte
+            # halbieren dort grob Speicherbedarf und Rechenzeit
+            if quantize and self.device.type == 'cpu':
+                # Batches laufen nacheinander, Parallelität entsteht nur innerhalb der Operatoren
+                try:
+                    torch.set_num_interop_threads(1)
+                except RuntimeError:
+                    # Lässt sich nur setzen, bevor torch parallel gearbeitet hat
+                    logger.warning("Could not limit torch inter-op threads")
+                
+                self.model = torch.ao.quantization.quantize_dynamic(
+                    self.model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+                logger.info("Model quantized to int8 for CPU inference")
+            
+            # Auf der GPU halbiert FP16 den Speicherverkehr und nutzt die Tensor-Cores,
+            # input_ids und attention_mask bleiben Ganzzahlen
+            if half_precision and self.device.type == 'cuda':
+                self.model.half()
+                logger.info("Model converted to FP16 for GPU inference")
+            
             logger.info(f"Model loaded and moved to {self.device}")
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             raise
         
-        # Labels definieren
-        self.labels = ['negative', 'neutral', 'positive']
+        # Labels definieren, als Tuple für schnelle Indexzugriffe in der Ergebnisschleife
+        self.labels = ('negative', 'neutral', 'positive')
+        
+        # Wiederverwendete Pinned-Memory-Puffer je Eingabe für asynchrone Kopien auf die GPU
+        self._pinned_inputs = {}
+        
+        # Aufgezeichnete CUDA Graphs je Eingabeform
+        self._use_cuda_graphs = cuda_graphs and self.device.type == 'cuda' and self.session is None
+        self._cuda_graphs = OrderedDict()
+        
+        # Ein erster Durchlauf bereitet die gepackten int8-Kernel bzw. die ONNX-Session vor,
+        # statt den ersten echten Batch zu verzögern
+        if (quantize and self.device.type == 'cpu') or self.session is not None:
+            self.analyze_texts(["Warm-up"])
+    
+    def _load_onnx_session(self, onnx_path):
+        """
+        Lädt das Modell in ONNX Runtime und exportiert es vorher, falls die Datei noch fehlt
+        
+        Args:
+            onnx_path: Pfad zum ONNX-Modell
+            
+        Returns:
+            Die InferenceSession oder None, wenn PyTorch verwendet werden soll
+        """
+        if ort is None:
+            logger.warning("onnxruntime not installed, using PyTorch for inference")
+            return None
+        
+        try:
+            if not os.path.exists(onnx_path):
+                self._export_onnx(onnx_path)
+            
+            providers = ['CPUExecutionProvider']
+            if self.device.type == 'cuda':
+                providers.insert(0, 'CUDAExecutionProvider')
+            
+            session = ort.InferenceSession(onnx_path, providers=providers)
+            self._onnx_input_names = [model_input.name for model_input in session.get_inputs()]
+            logger.info(f"ONNX model loaded from {onnx_path} with {session.get_providers()}")
+            return session
+        except Exception as e:
+            logger.error(f"Error loading ONNX model, using PyTorch for inference: {str(e)}")
+            return None
+    
+    def _export_onnx(self, onnx_path):
+        """
+        Exportiert das geladene Modell mit variabler Batchgröße und Sequenzlänge nach ONNX
+        
+        Args:
+            onnx_path: Zielpfad des ONNX-Modells
+        """
+        dummy = self.tokenizer(["Export"], return_tensors="pt")
+        input_names = list(dummy.keys())
+        dummy = {key: val.to(self.device) for key, val in dummy.items()}
+        
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+        dynamic_axes['logits'] = {0: 'batch'}
+        
+        torch.onnx.export(
+            self.model, (dummy,), onnx_path,
+            input_names=input_names, output_names=['logits'],
+            dynamic_axes=dynamic_axes, opset_version=17
+        )
+        logger.info(f"Model exported to {onnx_path}")
     
     def _load_checkpoint(self):
         """Lädt den letzten Checkpoint, falls vorhanden"""
         if os.path.exists(self.checkpoint_file):
             try:
-                with open(self.checkpoint_file, 'r') as f:
-                    self.current_state = json.load(f)
+                self.current_state = load_json(self.checkpoint_file)
+                self._last_saved_id = self.current_state['last_processed_id']
                 logger.info(f"Loaded checkpoint: {self.current_state}")
             except Exception as e:
                 logger.error(f"Error loading checkpoint: {str(e)}")
@@ -64,13 +203,44 @@ class FinBERTSentimentAnalyzer:
             logger.info("No checkpoint found, starting fresh")
     
     def _save_checkpoint(self):
-        """Speichert den aktuellen Zustand als Checkpoint"""
-        try:
-            with open(self.checkpoint_file, 'w') as f:
-                json.dump(self.current_state, f)
-            logger.info(f"Saved checkpoint: {self.current_state}")
-        except Exception as e:
-            logger.error(f"Error saving checkpoint: {str(e)}")
+        """
+        Übergibt den aktuellen Zustand an den Checkpoint-Thread, sofern sich die letzte ID geändert hat
+        
+        Ein noch nicht geschriebener älterer Zustand wird dabei ersetzt.
+        """
+        last_id = self.current_state['last_processed_id']
+        if last_id == self._last_saved_id:
+            return
+        
+        state = dict(self.current_state)
+        while True:
+            try:
+                self._ckpt_slot.put_nowait(state)
+                break
+            except queue.Full:
+                # Veralteten Zustand verwerfen, der Worker kann ihn inzwischen selbst geholt haben
+                try:
+                    self._ckpt_slot.get_nowait()
+                    self._ckpt_slot.task_done()
+                except queue.Empty:
+                    pass
+        self._last_saved_id = last_id
+    
+    def _ckpt_worker(self):
+        """Schreibt übergebene Zustände als Checkpoint-Datei"""
+        while True:
+            state = self._ckpt_slot.get()
+            try:
+                dump_json(self.checkpoint_file, state, fsync=True)
+                logger.info(f"Saved checkpoint: {state}")
+            except Exception as e:
+                logger.error(f"Error saving checkpoint: {str(e)}")
+            finally:
+                self._ckpt_slot.task_done()
+    
+    def flush_checkpoint(self):
+        """Wartet, bis alle übergebenen Checkpoints geschrieben sind"""
+        self._ckpt_slot.join()
     
     def analyze_text(self, text, max_length=512):
         """
@@ -83,30 +253,233 @@ class FinBERTSentimentAnalyzer:
         Returns:
             Ein Dictionary mit den Sentiment-Scores und dem dominierenden Sentiment
         """
+        return self.analyze_texts([text], max_length)[0]
+    
+    def analyze_texts(self, texts, max_length=512):
+        """
+        Analysiert mehrere Texte mit einem gemeinsamen Tokenizer-Aufruf und Forward-Pass
+        
+        Args:
+            texts: Liste der zu analysierenden Texte
+            max_length: Maximale Tokenanzahl (512 für BERT)
+            
+        Returns:
+            Liste mit einem Ergebnis wie bei analyze_text je Text, bei Fehler None-Einträge
+        """
         try:
-            # Text tokenisieren
-            inputs = self.tokenizer(text, return_tensors="pt", max_length=max_length, 
+            # Alle Texte gemeinsam tokenisieren, gepaddet auf den längsten Text
+            inputs = self.tokenizer(texts, return_tensors="pt", max_length=max_length, 
                                    truncation=True, padding=True)
-            inputs = {key: val.to(self.device) for key, val in inputs.items()}
+            return self._predict(inputs)
+        except Exception as e:
+            logger.error(f"Error analyzing texts: {str(e)}")
+            return [None] * len(texts)
+    
+    def _predict(self, inputs):
+        """
+        Berechnet die Sentiment-Ergebnisse für bereits tokenisierte und gepaddete Eingaben
+        
+        Args:
+            inputs: Tensoren des Tokenizers (input_ids, attention_mask, ...)
             
-            # Modell-Ausgabe berechnen
-            with torch.no_grad():
-                outputs = self.model(**inputs)
+        Returns:
+            Liste mit einem Ergebnis je Sequenz
+        """
+        if self.session is not None:
+            # ONNX Runtime arbeitet direkt auf den NumPy-Arrays der Eingaben
+            feed = {name: inputs[name].numpy() for name in self._onnx_input_names}
+            logits = self.session.run(None, feed)[0].astype(np.float32)
             
             # Softmax anwenden, um Wahrscheinlichkeiten zu erhalten
-            scores = torch.nn.functional.softmax(outputs.logits, dim=1).cpu().numpy()[0]
+            exp_logits = np.exp(logits - logits.max(axis=1, keepdims=True))
+            scores = exp_logits / exp_logits.sum(axis=1, keepdims=True)
+            best = np.argmax(scores, axis=1)
+        else:
+            inputs = self._to_device(inputs)
             
-            # Ergebnisse zusammenstellen
-            result = {
-                'scores': {self.labels[i]: float(scores[i]) for i in range(len(self.labels))},
-                'dominant_sentiment': self.labels[np.argmax(scores)],
-                'confidence': float(np.max(scores))
-            }
+            # Modell-Ausgabe berechnen, inference_mode spart gegenüber no_grad die Versionszähler und View-Verfolgung
+            with torch.inference_mode():
+                logits = self._forward(inputs)
+                
+                # Softmax in FP32 anwenden, um Wahrscheinlichkeiten zu erhalten, und das
+                # dominante Label noch auf dem Gerät bestimmen
+                scores = torch.nn.functional.softmax(logits.float(), dim=1)
+                best = scores.argmax(dim=1)
+                
+                # Scores und Index in einem Tensor zurückkopieren statt in mehreren Transfers
+                packed = torch.cat([scores, best.unsqueeze(1).float()], dim=1)
+            if self.device.type == 'cuda':
+                packed = packed.to('cpu', non_blocking=True)
+                torch.cuda.current_stream().synchronize()
+            packed = packed.numpy()
+            scores = packed[:, :-1]
+            best = packed[:, -1].astype(np.int64)
+        
+        # Ergebnisse zusammenstellen, tolist() wandelt alle Scores auf einmal in Python-Floats
+        results = []
+        for score_values, best_index in zip(scores.tolist(), best.tolist()):
+            results.append({
+                'scores': dict(zip(self.labels, score_values)),
+                'dominant_sentiment': self.labels[best_index],
+                'confidence': score_values[best_index]
+            })
+        
+        return results
+    
+    def _forward(self, inputs):
+        """
+        Berechnet die Logits, auf der GPU für kurze Sequenzen über einen aufgezeichneten CUDA Graph
+        
+        Args:
+            inputs: Eingabetensoren auf dem Gerät des Modells
             
-            return result
-        except Exception as e:
-            logger.error(f"Error analyzing text: {str(e)}")
-            return None
+        Returns:
+            Die Logits; bei CUDA Graphs eine Sicht auf den statischen Ausgabetensor, der beim nächsten Aufruf überschrieben wird
+        """
+        batch, seq_len = inputs['input_ids'].shape
+        if (not self._use_cuda_graphs or seq_len > CUDA_GRAPH_MAX_SEQ_LEN
+                or batch > CUDA_GRAPH_BATCH_BUCKETS[-1]):
+            return self.model(**inputs).logits
+        
+        # Auf die nächste feste Form auffüllen; die zusätzlichen Positionen sind über die
+        # attention_mask ausgeblendet, die zusätzlichen Zeilen werden unten abgeschnitten
+        inputs = self._pad_to_bucket(inputs, batch, seq_len)
+        
+        key = tuple((name, tuple(val.shape)) for name, val in inputs.items())
+        entry = self._cuda_graphs.get(key)
+        if entry is None:
+            try:
+                entry = self._capture_cuda_graph(inputs)
+            except Exception as e:
+                logger.warning(f"CUDA graph capture failed, running eagerly: {str(e)}")
+                self._use_cuda_graphs = False
+                return self.model(**inputs).logits
+            
+            self._cuda_graphs[key] = entry
+            if len(self._cuda_graphs) > CUDA_GRAPH_CACHE_SIZE:
+                self._cuda_graphs.popitem(last=False)
+        else:
+            self._cuda_graphs.move_to_end(key)
+        
+        # Neue Eingaben in die statischen Tensoren kopieren und den Graphen wiederholen
+        static_inputs, static_logits, graph = entry
+        for name, val in inputs.items():
+            static_inputs[name].copy_(val)
+        graph.replay()
+        return static_logits[:batch]
+    
+    def _pad_to_bucket(self, inputs, batch, seq_len):
+        """
+        Füllt die Eingaben rechts und unten auf die nächste Form aus den CUDA-Graph-Stufen auf
+        
+        Args:
+            inputs: Eingabetensoren auf der GPU
+            batch: Anzahl der Sequenzen
+            seq_len: Gepaddete Länge der Sequenzen
+            
+        Returns:
+            Dict mit den aufgefüllten Eingabetensoren
+        """
+        bucket_batch = next(size for size in CUDA_GRAPH_BATCH_BUCKETS if size >= batch)
+        bucket_len = -(-seq_len // CUDA_GRAPH_SEQ_BUCKET) * CUDA_GRAPH_SEQ_BUCKET
+        if bucket_batch == batch and bucket_len == seq_len:
+            return inputs
+        
+        pad_token_id = self.tokenizer.pad_token_id or 0
+        padding = (0, bucket_len - seq_len, 0, bucket_batch - batch)
+        return {
+            name: torch.nn.functional.pad(val, padding, value=pad_token_id if name == 'input_ids' else 0)
+            for name, val in inputs.items()
+        }
+    
+    def _capture_cuda_graph(self, inputs):
+        """
+        Zeichnet den Forward-Pass für die Form der Eingaben als CUDA Graph auf
+        
+        Args:
+            inputs: Eingabetensoren auf der GPU, deren Form der Graph festlegt
+            
+        Returns:
+            Tuple aus statischen Eingabetensoren, statischem Ausgabetensor und Graph
+        """
+        static_inputs = {name: val.clone() for name, val in inputs.items()}
+        
+        # Aufwärmen auf einem eigenen Stream, damit cuBLAS & Co. vor der Aufzeichnung initialisiert sind
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(3):
+                self.model(**static_inputs)
+        torch.cuda.current_stream().wait_stream(stream)
+        
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph):
+            static_logits = self.model(**static_inputs).logits
+        
+        logger.info(f"Captured CUDA graph for input shape {tuple(inputs['input_ids'].shape)}")
+        return static_inputs, static_logits, graph
+    
+    def _to_device(self, inputs):
+        """
+        Verschiebt die Eingabetensoren auf das Gerät des Modells
+        
+        Auf der GPU werden die Tensoren zuerst in wiederverwendete Pinned-Memory-Puffer kopiert,
+        aus denen die Kopie auf die GPU asynchron laufen kann.
+        
+        Args:
+            inputs: Tensoren des Tokenizers (input_ids, attention_mask, ...)
+            
+        Returns:
+            Dict mit den Tensoren auf dem Gerät des Modells
+        """
+        if self.device.type != 'cuda':
+            return {key: val.to(self.device) for key, val in inputs.items()}
+        
+        device_inputs = {}
+        for key, val in inputs.items():
+            buffer = self._pinned_inputs.get(key)
+            if buffer is None or buffer.numel() < val.numel() or buffer.dtype != val.dtype:
+                # Mindestens ein volles Token-Budget, damit der Puffer selten neu angelegt wird
+                buffer = torch.empty(max(val.numel(), TOKEN_BUDGET), dtype=val.dtype, pin_memory=True)
+                self._pinned_inputs[key] = buffer
+            
+            # Zusammenhängende Sicht auf den Pufferanfang in der Form der Eingabe
+            staging = buffer[:val.numel()].view(val.shape)
+            staging.copy_(val)
+            device_inputs[key] = staging.to(self.device, non_blocking=True)
+        
+        return device_inputs
+    
+    @staticmethod
+    def _length_groups(lengths, batch_size, token_budget=TOKEN_BUDGET):
+        """
+        Teilt Sequenzen nach Länge sortiert in Gruppen für je einen Forward-Pass auf
+        
+        Ähnlich lange Sequenzen landen in derselben Gruppe, sodass kaum gepaddet wird.
+        Kurze Sequenzen ergeben größere Gruppen, lange kleinere.
+        
+        Args:
+            lengths: Tokenanzahl je Sequenz
+            batch_size: Maximale Anzahl an Sequenzen je Gruppe
+            token_budget: Maximale Anzahl gepaddeter Tokens je Gruppe
+            
+        Returns:
+            Liste von Gruppen mit den Indizes der Sequenzen
+        """
+        order = sorted(range(len(lengths)), key=lengths.__getitem__, reverse=True)
+        
+        groups = []
+        group = []
+        for index in order:
+            # Absteigend sortiert: die erste Sequenz bestimmt die gepaddete Länge der Gruppe
+            if group and (len(group) >= batch_size or (len(group) + 1) * lengths[group[0]] > token_budget):
+                groups.append(group)
+                group = []
+            group.append(index)
+        if group:
+            groups.append(group)
+        
+        return groups
     
     def analyze_long_text(self, text, chunk_size=512):
         """
@@ -120,26 +493,28 @@ class FinBERTSentimentAnalyzer:
             Ein gemitteltes Sentiment-Ergebnis
         """
         try:
-            # Text in Chunks aufteilen
-            tokenized = self.tokenizer.encode(text)
-            chunks = [tokenized[i:i + chunk_size] for i in range(0, len(tokenized), chunk_size)]
+            # Text einmal ohne Sondertokens tokenisieren und die IDs in Chunks aufteilen,
+            # sodass jeder Chunk samt [CLS]/[SEP] höchstens chunk_size Tokens hat
+            tokenized = self.tokenizer.encode(text, add_special_tokens=False)
+            body_size = chunk_size - self.tokenizer.num_special_tokens_to_add()
+            chunks = [tokenized[i:i + body_size] for i in range(0, len(tokenized), body_size)]
+            
+            # Die IDs direkt als Modelleingaben verwenden statt sie zu dekodieren und neu zu tokenisieren
+            features = [self.tokenizer.prepare_for_model(chunk, add_special_tokens=True) for chunk in chunks]
+            lengths = [len(feature['input_ids']) for feature in features]
             
-            # Für jeden Chunk das Sentiment analysieren
+            # Alle Chunks in möglichst wenigen Forward-Passes analysieren
             chunk_results = []
-            for chunk in chunks:
-                chunk_text = self.tokenizer.decode(chunk)
-                result = self.analyze_text(chunk_text)
-                if result:
-                    chunk_results.append(result)
+            for group in self._length_groups(lengths, batch_size=32):
+                inputs = self.tokenizer.pad([features[index] for index in group], return_tensors="pt")
+                chunk_results.extend(self._predict(inputs))
             
             if not chunk_results:
                 return None
             
-            # Mittelwerte berechnen
-            avg_scores = {label: 0.0 for label in self.labels}
-            for result in chunk_results:
-                for label, score in result['scores'].items():
-                    avg_scores[label] += score / len(chunk_results)
+            # Mittelwerte über alle Chunks in einem Schritt berechnen
+            chunk_scores = np.array([[result['scores'][label] for label in self.labels] for result in chunk_results])
+            avg_scores = dict(zip(self.labels, chunk_scores.mean(axis=0).tolist()))
             
             # Dominantes Sentiment bestimmen
             dominant_label = max(avg_scores, key=avg_scores.get)
@@ -163,46 +538,102 @@ class FinBERTSentimentAnalyzer:
         self.pause_event = pause_event
         logger.info("Interruptible processing enabled")
     
-    def process_news_batch(self, news_items, batch_size=10):
+    def process_news_batch(self, news_items, batch_size=32, skip_processed=True):
         """
-        Verarbeitet einen Batch von Nachrichtenartikeln und speichert den Fortschritt
+        Verarbeitet Nachrichtenartikel und speichert den Fortschritt
+        
+        Die Artikel werden fensterweise aus dem Iterable gelesen, sodass nie mehr als ein Fenster
+        im Speicher liegt. Für einen korrekten Checkpoint müssen sie nach aufsteigender ID kommen.
         
         Args:
-            news_items: Liste von Nachrichtenartikeln (dict mit 'id', 'title', 'summary')
+            news_items: Iterable von Nachrichtenartikeln (dict oder sqlite3.Row mit 'id', 'symbol', 'title', 'summary')
             batch_size: Anzahl der Artikel pro Batch
+            skip_processed: Artikel bis zur ID im eigenen Checkpoint überspringen. Aufrufer mit eigenem
+                            Checkpoint (z. B. der ML-Prozessor) schalten das ab, sonst gingen nach einem
+                            Absturz Artikel verloren, die hier schon als verarbeitet gelten, deren
+                            Ergebnisse der Aufrufer aber noch nicht gespeichert hat
             
         Returns:
             Liste von Ergebnissen mit Sentiment-Analyse
         """
         results = []
         
-        for i in range(0, len(news_items), batch_size):
+        # Nur neue IDs verarbeiten, gemessen am Checkpoint zu Beginn des Aufrufs
+        if skip_processed:
+            start_id = self.current_state['last_processed_id']
+            new_items = (item for item in news_items if item['id'] > start_id)
+        else:
+            new_items = iter(news_items)
+        
+        while True:
+            window = list(itertools.islice(new_items, batch_size * STREAM_WINDOW_BATCHES))
+            if not window or not self._process_window(window, batch_size, results):
+                break
+        
+        return results
+    
+    def _process_window(self, pending, batch_size, results):
+        """
+        Verarbeitet ein Fenster neuer Nachrichtenartikel in Längengruppen
+        
+        Args:
+            pending: Liste der noch nicht verarbeiteten Artikel
+            batch_size: Anzahl der Artikel pro Batch
+            results: Liste, an die die Ergebnisse angehängt werden
+            
+        Returns:
+            True, wenn mit dem nächsten Fenster weitergemacht werden kann, sonst False (Pause oder Fehler)
+        """
+        # Kombination aus Titel und Zusammenfassung einmal ungepaddet tokenisieren, um die Längen zu kennen
+        try:
+            encoded = self.tokenizer([f"{item['title']} {item['summary']}" for item in pending],
+                                     max_length=512, truncation=True)
+        except Exception as e:
+            logger.error(f"Error tokenizing news batch: {str(e)}")
+            return False
+        
+        lengths = [len(input_ids) for input_ids in encoded['input_ids']]
+        
+        # Der Checkpoint rückt nur bis vor die kleinste noch offene ID vor, da die Gruppen nicht nach ID geordnet sind
+        pending_ids = sorted(item['id'] for item in pending)
+        done_ids = set()
+        next_pending = 0
+        
+        for group in self._length_groups(lengths, batch_size):
             # Prüfen, ob Pause angefordert wurde
-            if hasattr(self, 'pause_event') and self.pause_event.is_set():
+            if self.pause_event is not None and self.pause_event.is_set():
                 logger.info("Processing paused, saving checkpoint")
                 self._save_checkpoint()
-                return results
-            
-            batch = news_items[i:i + batch_size]
-            for item in batch:
-                # Nur verarbeiten, wenn es eine neue ID ist
-                if item['id'] > self.current_state['last_processed_id']:
-                    # Kombination aus Titel und Zusammenfassung analysieren
-                    full_text = f"{item['title']} {item['summary']}"
-                    sentiment = self.analyze_text(full_text)
-                    
-                    if sentiment:
-                        result = {
-                            'id': item['id'],
-                            'symbol': item['symbol'],
-                            'sentiment': sentiment
-                        }
-                        results.append(result)
-                        
-                        # Letzte verarbeitete ID aktualisieren
-                        self.current_state['last_processed_id'] = item['id']
+                self.flush_checkpoint()
+                return False
+            
+            try:
+                features = [{key: encoded[key][index] for key in encoded.keys()} for index in group]
+                sentiments = self._predict(self.tokenizer.pad(features, return_tensors="pt"))
+            except Exception as e:
+                logger.error(f"Error analyzing texts: {str(e)}")
+                sentiments = [None] * len(group)
+            
+            for index, sentiment in zip(group, sentiments):
+                item = pending[index]
+                done_ids.add(item['id'])
+                
+                if sentiment:
+                    result = {
+                        'id': item['id'],
+                        'symbol': item['symbol'],
+                        'sentiment': sentiment
+                    }
+                    results.append(result)
+            
+            # Letzte verarbeitete ID aktualisieren
+            while next_pending < len(pending_ids) and pending_ids[next_pending] in done_ids:
+                next_pending += 1
+            # Ohne Filter (skip_processed=False) können die IDs unter dem Checkpoint liegen, er geht nie zurück
+            if next_pending and pending_ids[next_pending - 1] > self.current_state['last_processed_id']:
+                self.current_state['last_processed_id'] = pending_ids[next_pending - 1]
             
             # Checkpoint nach jedem Batch speichern
             self._save_checkpoint()
         
-        return results
+        return True
@@ -1,7 +1,9 @@
-import sqlite3
 import logging
 import datetime
 import json
+import threading
+import numpy as np
+from db_utils import open_db
 
 # Logger konfigurieren
 logging.basicConfig(
@@ -11,6 +13,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger('SignalGenerator')
 
+# SQL-Anweisungen der häufigen Schreibzugriffe als Konstanten, damit jeder Aufruf den Statement-Cache der Verbindung trifft
+SQL_INSERT_SIGNAL = '''
+INSERT INTO trading_signals
+(symbol, timestamp, signal_type, confidence, close_price, 
+technical_signal, sentiment_signal, reason)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SQL_MARK_NOTIFIED = '''
+UPDATE trading_signals
+SET notified = 1
+WHERE id = ?
+'''
+
+SQL_VERIFY_SIGNAL = '''
+UPDATE trading_signals
+SET verified = 1, outcome = ?
+WHERE id = ?
+'''
+
+# Signale als Codes für die spaltenweise Kombination
+SIGNAL_CODES = {'SELL': -1, 'NEUTRAL': 0, 'BUY': 1}
+CODE_SIGNALS = {code: signal for signal, code in SIGNAL_CODES.items()}
+
 class SignalGenerator:
     def __init__(self, db_path, confidence_threshold=0.7):
         """
@@ -22,109 +48,153 @@ class SignalGenerator:
         """
         self.db_path = db_path
         self.confidence_threshold = confidence_threshold
+        
+        # Eine Verbindung für die gesamte Laufzeit, der Lock schützt sie vor parallelem Zugriff
+        self._conn = open_db(db_path, cached_statements=256)
+        self._db_lock = threading.Lock()
+        
+        # Signaltabelle einmalig anlegen statt bei jedem Speichern
+        self._create_signals_table()
+        
         logger.info(f"SignalGenerator initialized with database at {db_path} and threshold {confidence_threshold}")
     
-    def _get_latest_technical_analysis(self, symbol):
+    def _create_signals_table(self):
+        """Erstellt die Tabelle für Trading-Signale in der Datenbank"""
+        try:
+            with self._db_lock:
+                self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS trading_signals (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    symbol TEXT,
+                    timestamp TEXT,
+                    signal_type TEXT,
+                    confidence REAL,
+                    close_price REAL,
+                    technical_signal TEXT,
+                    sentiment_signal TEXT,
+                    reason TEXT,
+                    notified INTEGER DEFAULT 0,
+                    verified INTEGER DEFAULT 0,
+                    outcome TEXT DEFAULT NULL
+                )
+                ''')
+                self._conn.execute('CREATE INDEX IF NOT EXISTS idx_trading_signals_ts ON trading_signals(timestamp DESC)')
+                # Teilindex nur über unbenachrichtigte Signale, bleibt klein und liefert sie bereits sortiert
+                self._conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_signals_unnotified
+                ON trading_signals(timestamp DESC) WHERE notified = 0
+                ''')
+            
+            logger.info("Trading signals table created or already exists")
+        except Exception as e:
+            logger.error(f"Error creating trading signals table: {str(e)}")
+    
+    def _get_latest_technical_analyses(self, symbols):
         """
-        Holt die neueste technische Analyse für ein Symbol
+        Holt die neueste technische Analyse für mehrere Symbole in einer Abfrage
         
         Args:
-            symbol: Das Aktiensymbol
+            symbols: Liste von Aktiensymbolen
             
         Returns:
-            Die neueste technische Analyse oder None
+            Dict von Symbol auf die neueste technische Analyse, Symbole ohne Analyse fehlen
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT id, symbol, timestamp, close_price, overall_signal, signal_strength
-            FROM technical_analysis
-            WHERE symbol = ?
-            ORDER BY timestamp DESC
-            LIMIT 1
-            ''', (symbol,))
-            
-            row = cursor.fetchone()
-            conn.close()
-            
-            if not row:
-                return None
+            placeholders = ', '.join('?' * len(symbols))
+            with self._db_lock:
+                rows = self._conn.execute(f'''
+                SELECT id, symbol, timestamp, close_price, overall_signal, signal_strength
+                FROM (
+                    SELECT id, symbol, timestamp, close_price, overall_signal, signal_strength,
+                           ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY timestamp DESC) AS rn
+                    FROM technical_analysis
+                    WHERE symbol IN ({placeholders})
+                )
+                WHERE rn = 1
+                ''', tuple(symbols)).fetchall()
             
             return {
-                'id': row[0],
-                'symbol': row[1],
-                'timestamp': row[2],
-                'close_price': row[3],
-                'overall_signal': row[4],
-                'signal_strength': row[5]
+                row[1]: {
+                    'id': row[0],
+                    'symbol': row[1],
+                    'timestamp': row[2],
+                    'close_price': row[3],
+                    'overall_signal': row[4],
+                    'signal_strength': row[5]
+                }
+                for row in rows
             }
         except Exception as e:
-            logger.error(f"Error getting technical analysis for {symbol}: {str(e)}")
-            return None
+            logger.error(f"Error getting technical analysis for {len(symbols)} symbols: {str(e)}")
+            return {}
     
-    def _get_latest_sentiment(self, symbol):
+    def _get_latest_sentiments(self, symbols):
         """
-        Holt die neueste Sentiment-Analyse für ein Symbol
+        Holt die neueste Sentiment-Analyse für mehrere Symbole in einer Abfrage
         
         Args:
-            symbol: Das Aktiensymbol
+            symbols: Liste von Aktiensymbolen
             
         Returns:
-            Die neueste Sentiment-Analyse oder None
+            Dict von Symbol auf die neueste Sentiment-Analyse, Symbole ohne Nachrichten fehlen
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            placeholders = ', '.join('?' * len(symbols))
+            # Die letzten 5 Nachrichtenartikel je Symbol, neueste zuerst
+            with self._db_lock:
+                rows = self._conn.execute(f'''
+                SELECT news_id, symbol, negative_score, neutral_score, positive_score,
+                       dominant_sentiment, confidence, title, summary
+                FROM (
+                    SELECT sr.news_id, sr.symbol, sr.negative_score, sr.neutral_score, sr.positive_score,
+                           sr.dominant_sentiment, sr.confidence, nd.title, nd.summary,
+                           ROW_NUMBER() OVER (PARTITION BY sr.symbol ORDER BY sr.timestamp DESC) AS rn
+                    FROM sentiment_results sr
+                    JOIN news_data nd ON sr.news_id = nd.rowid
+                    WHERE sr.symbol IN ({placeholders})
+                )
+                WHERE rn <= 5
+                ORDER BY symbol, rn
+                ''', tuple(symbols)).fetchall()
             
-            cursor.execute('''
-            SELECT sr.news_id, sr.symbol, sr.negative_score, sr.neutral_score, sr.positive_score,
-                   sr.dominant_sentiment, sr.confidence, nd.title, nd.summary
-            FROM sentiment_results sr
-            JOIN news_data nd ON sr.news_id = nd.rowid
-            WHERE sr.symbol = ?
-            ORDER BY sr.timestamp DESC
-            LIMIT 5
-            ''', (symbol,))
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
-            if not rows:
-                return None
-            
-            # Durchschnittliches Sentiment aus den letzten 5 Nachrichtenartikeln berechnen
-            avg_negative = sum(row[2] for row in rows) / len(rows)
-            avg_neutral = sum(row[3] for row in rows) / len(rows)
-            avg_positive = sum(row[4] for row in rows) / len(rows)
-            
-            # Dominantes Sentiment bestimmen
-            scores = {
-                'negative': avg_negative,
-                'neutral': avg_neutral,
-                'positive': avg_positive
-            }
-            dominant = max(scores, key=scores.get)
-            confidence = scores[dominant]
+            rows_by_symbol = {}
+            for row in rows:
+                rows_by_symbol.setdefault(row[1], []).append(row)
             
-            # Die neueste Nachricht für Referenz speichern
-            latest = rows[0]
+            sentiments = {}
+            for symbol, symbol_rows in rows_by_symbol.items():
+                # Durchschnittliches Sentiment aus den letzten 5 Nachrichtenartikeln in einem Durchlauf berechnen
+                score_rows = np.array([row[2:5] for row in symbol_rows], dtype=float)
+                avg_negative, avg_neutral, avg_positive = score_rows.mean(axis=0).tolist()
+                
+                # Dominantes Sentiment bestimmen
+                scores = {
+                    'negative': avg_negative,
+                    'neutral': avg_neutral,
+                    'positive': avg_positive
+                }
+                dominant = max(scores, key=scores.get)
+                confidence = scores[dominant]
+                
+                # Die neueste Nachricht für Referenz speichern
+                latest = symbol_rows[0]
+                
+                sentiments[symbol] = {
+                    'symbol': symbol,
+                    'avg_negative': avg_negative,
+                    'avg_neutral': avg_neutral,
+                    'avg_positive': avg_positive,
+                    'dominant_sentiment': dominant,
+                    'confidence': confidence,
+                    'latest_news_id': latest[0],
+                    'latest_news_title': latest[7],
+                    'latest_news_summary': latest[8]
+                }
             
-            return {
-                'symbol': symbol,
-                'avg_negative': avg_negative,
-                'avg_neutral': avg_neutral,
-                'avg_positive': avg_positive,
-                'dominant_sentiment': dominant,
-                'confidence': confidence,
-                'latest_news_id': latest[0],
-                'latest_news_title': latest[7],
-                'latest_news_summary': latest[8]
-            }
+            return sentiments
         except Exception as e:
-            logger.error(f"Error getting sentiment for {symbol}: {str(e)}")
-            return None
+            logger.error(f"Error getting sentiment for {len(symbols)} symbols: {str(e)}")
+            return {}
     
     def _map_sentiment_to_signal(self, sentiment):
         """
@@ -155,67 +225,96 @@ class SignalGenerator:
         """
         signals = []
         
+        if not symbols:
+            return signals
+        
+        # Technische Analysen und Sentiments für alle Symbole auf einmal holen
+        technicals = self._get_latest_technical_analyses(symbols)
+        sentiments = self._get_latest_sentiments(symbols)
+        
+        # Alle Signale eines Durchlaufs erhalten denselben Zeitstempel
+        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        # Symbole ohne technische Analyse überspringen
+        available = []
         for symbol in symbols:
+            if symbol in technicals:
+                available.append(symbol)
+            else:
+                logger.warning(f"No technical analysis available for {symbol}")
+        
+        if not available:
+            return signals
+        
+        try:
+            # Signale als Codes (-1, 0, +1) und Stärken spaltenweise für alle Symbole aufbauen,
+            # ohne Sentiment gilt NEUTRAL mit Stärke 0.5
+            tech_signals = [technicals[symbol]['overall_signal'] for symbol in available]
+            sent_signals = [
+                self._map_sentiment_to_signal(sentiments[symbol]['dominant_sentiment']) if symbol in sentiments else 'NEUTRAL'
+                for symbol in available
+            ]
+            tech_code = np.array([SIGNAL_CODES.get(signal, 0) for signal in tech_signals], dtype=np.int8)
+            sent_code = np.array([SIGNAL_CODES.get(signal, 0) for signal in sent_signals], dtype=np.int8)
+            tech_strength = np.array([technicals[symbol]['signal_strength'] for symbol in available], dtype=float)
+            sent_strength = np.array(
+                [sentiments[symbol]['confidence'] if symbol in sentiments else 0.5 for symbol in available],
+                dtype=float
+            )
+            
+            # Fälle der Kombination: Übereinstimmung, Widerspruch, nur technisch, nur Sentiment, beide neutral
+            agree = (tech_code == sent_code) & (tech_code != 0)
+            conflict = (tech_code != 0) & (sent_code != 0) & (tech_code != sent_code)
+            tech_only = (tech_code != 0) & ~agree & ~conflict
+            sent_only = (tech_code == 0) & (sent_code != 0)
+            
+            # Starkes Signal, wenn beide übereinstimmen; widersprüchliche Signale neutralisieren;
+            # sonst das vorhandene Signal stärker gewichten
+            combined_code = np.select([conflict, tech_code != 0], [0, tech_code], default=sent_code)
+            combined_strength = np.select(
+                [agree, conflict, tech_only, sent_only],
+                [
+                    (tech_strength + sent_strength) / 2,
+                    np.maximum(tech_strength, sent_strength),
+                    tech_strength * 0.7 + sent_strength * 0.3,
+                    sent_strength * 0.6 + tech_strength * 0.4
+                ],
+                default=(tech_strength + sent_strength) / 2
+            )
+            
+            # Signal nur bei ausreichender Konfidenz generieren
+            selected = np.flatnonzero(combined_strength >= self.confidence_threshold).tolist()
+        except Exception as e:
+            logger.error(f"Error combining signals for {len(available)} symbols: {str(e)}")
+            return signals
+        
+        combined_codes = combined_code.tolist()
+        combined_strengths = combined_strength.tolist()
+        tech_strengths = tech_strength.tolist()
+        sent_strengths = sent_strength.tolist()
+        
+        for index in selected:
+            symbol = available[index]
             try:
-                # Technische Analyse und Sentiment holen
-                technical = self._get_latest_technical_analysis(symbol)
-                sentiment = self._get_latest_sentiment(symbol)
-                
-                if not technical:
-                    logger.warning(f"No technical analysis available for {symbol}")
-                    continue
-                
-                # Basis-Signal aus technischer Analyse
-                tech_signal = technical['overall_signal']
-                tech_strength = technical['signal_strength']
+                combined_signal = CODE_SIGNALS[combined_codes[index]]
+                sentiment = sentiments.get(symbol)
                 
-                # Sentiment-basiertes Signal (falls verfügbar)
-                if sentiment:
-                    sent_signal = self._map_sentiment_to_signal(sentiment['dominant_sentiment'])
-                    sent_strength = sentiment['confidence']
-                else:
-                    sent_signal = 'NEUTRAL'
-                    sent_strength = 0.5
+                # Signal-Metadaten zusammenstellen
+                signal = {
+                    'symbol': symbol,
+                    'timestamp': timestamp,
+                    'signal_type': combined_signal,
+                    'confidence': combined_strengths[index],
+                    'close_price': technicals[symbol]['close_price'],
+                    'technical_signal': tech_signals[index],
+                    'technical_strength': tech_strengths[index],
+                    'sentiment_signal': sent_signals[index],
+                    'sentiment_strength': sent_strengths[index],
+                    'reason': self._generate_reason(tech_signals[index], sent_signals[index], sentiment)
+                }
                 
-                # Kombiniertes Signal berechnen
-                if tech_signal == sent_signal and tech_signal != 'NEUTRAL':
-                    # Starkes Signal, wenn beide übereinstimmen
-                    combined_signal = tech_signal
-                    combined_strength = (tech_strength + sent_strength) / 2
-                elif tech_signal != 'NEUTRAL' and sent_signal != 'NEUTRAL' and tech_signal != sent_signal:
-                    # Widersprüchliche Signale, Neutralisieren
-                    combined_signal = 'NEUTRAL'
-                    combined_strength = max(tech_strength, sent_strength)
-                elif tech_signal != 'NEUTRAL':
-                    # Technisches Signal stärker gewichten
-                    combined_signal = tech_signal
-                    combined_strength = tech_strength * 0.7 + sent_strength * 0.3
-                elif sent_signal != 'NEUTRAL':
-                    # Sentiment-Signal stärker gewichten
-                    combined_signal = sent_signal
-                    combined_strength = sent_strength * 0.6 + tech_strength * 0.4
-                else:
-                    combined_signal = 'NEUTRAL'
-                    combined_strength = (tech_strength + sent_strength) / 2
-                
-                # Signal nur bei ausreichender Konfidenz generieren
-                if combined_strength >= self.confidence_threshold:
-                    # Signal-Metadaten zusammenstellen
-                    signal = {
-                        'symbol': symbol,
-                        'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                        'signal_type': combined_signal,
-                        'confidence': combined_strength,
-                        'close_price': technical['close_price'],
-                        'technical_signal': tech_signal,
-                        'technical_strength': tech_strength,
-                        'sentiment_signal': sent_signal,
-                        'sentiment_strength': sent_strength,
-                        'reason': self._generate_reason(tech_signal, sent_signal, sentiment)
-                    }
-                    
-                    signals.append(signal)
-                    logger.info(f"Generated {combined_signal} signal for {symbol} with confidence {combined_strength:.2f}")
+                signals.append(signal)
+                logger.info(f"Generated {combined_signal} signal for {symbol} with confidence {combined_strengths[index]:.2f}")
             except Exception as e:
                 logger.error(f"Error generating signal for {symbol}: {str(e)}")
         
@@ -258,48 +357,33 @@ class SignalGenerator:
         if not signals:
             return
         
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Tabelle erstellen, falls sie nicht existiert
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS trading_signals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                symbol TEXT,
-                timestamp TEXT,
-                signal_type TEXT,
-                confidence REAL,
-                close_price REAL,
-                technical_signal TEXT,
-                sentiment_signal TEXT,
-                reason TEXT,
-                notified INTEGER DEFAULT 0,
-                verified INTEGER DEFAULT 0,
-                outcome TEXT DEFAULT NULL
+        rows = [
+            (
+                signal['symbol'],
+                signal['timestamp'],
+                signal['signal_type'],
+                signal['confidence'],
+                signal['close_price'],
+                signal['technical_signal'],
+                signal['sentiment_signal'],
+                signal['reason']
             )
-            ''')
-            
-            # Signale speichern
-            for signal in signals:
-                cursor.execute('''
-                INSERT INTO trading_signals
-                (symbol, timestamp, signal_type, confidence, close_price, 
-                technical_signal, sentiment_signal, reason)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    signal['symbol'],
-                    signal['timestamp'],
-                    signal['signal_type'],
-                    signal['confidence'],
-                    signal['close_price'],
-                    signal['technical_signal'],
-                    signal['sentiment_signal'],
-                    signal['reason']
-                ))
+            for signal in signals
+        ]
+        
+        try:
+            with self._db_lock:
+                cursor = self._conn.cursor()
+                cursor.execute('BEGIN')
+                try:
+                    # Signale in einem Aufruf speichern
+                    cursor.executemany(SQL_INSERT_SIGNAL, rows)
+                except Exception:
+                    if self._conn.in_transaction:
+                        cursor.execute('ROLLBACK')
+                    raise
+                cursor.execute('COMMIT')
             
-            conn.commit()
-            conn.close()
             logger.info(f"Saved {len(signals)} signals to database")
         except Exception as e:
             logger.error(f"Error saving signals: {str(e)}")
@@ -312,18 +396,13 @@ class SignalGenerator:
             Liste von unbenachrichtigten Signalen
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT id, symbol, timestamp, signal_type, confidence, close_price, reason
-            FROM trading_signals
-            WHERE notified = 0
-            ORDER BY timestamp DESC
-            ''')
-            
-            rows = cursor.fetchall()
-            conn.close()
+            with self._db_lock:
+                rows = self._conn.execute('''
+                SELECT id, symbol, timestamp, signal_type, confidence, close_price, reason
+                FROM trading_signals
+                WHERE notified = 0
+                ORDER BY timestamp DESC
+                ''').fetchall()
             
             signals = []
             for row in rows:
@@ -351,23 +430,41 @@ class SignalGenerator:
             signal_id: Die ID des Signals
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            UPDATE trading_signals
-            SET notified = 1
-            WHERE id = ?
-            ''', (signal_id,))
-            
-            conn.commit()
-            conn.close()
+            with self._db_lock:
+                self._conn.execute(SQL_MARK_NOTIFIED, (signal_id,))
             logger.info(f"Marked signal {signal_id} as notified")
             return True
         except Exception as e:
             logger.error(f"Error marking signal as notified: {str(e)}")
             return False
     
+    def mark_signals_as_notified(self, signal_ids):
+        """
+        Markiert mehrere Signale in einer Transaktion als benachrichtigt
+        
+        Args:
+            signal_ids: Die IDs der Signale
+        """
+        if not signal_ids:
+            return True
+        
+        try:
+            with self._db_lock:
+                cursor = self._conn.cursor()
+                cursor.execute('BEGIN')
+                try:
+                    cursor.executemany(SQL_MARK_NOTIFIED, [(signal_id,) for signal_id in signal_ids])
+                except Exception:
+                    if self._conn.in_transaction:
+                        cursor.execute('ROLLBACK')
+                    raise
+                cursor.execute('COMMIT')
+            logger.info(f"Marked {len(signal_ids)} signals as notified")
+            return True
+        except Exception as e:
+            logger.error(f"Error marking signals as notified: {str(e)}")
+            return False
+    
     def verify_signal(self, signal_id, outcome):
         """
         Verifiziert ein Signal mit dem tatsächlichen Outcome
@@ -377,19 +474,15 @@ class SignalGenerator:
             outcome: Der tatsächliche Outcome (SUCCESS oder FAILURE)
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            UPDATE trading_signals
-            SET verified = 1, outcome = ?
-            WHERE id = ?
-            ''', (outcome, signal_id))
-            
-            conn.commit()
-            conn.close()
+            with self._db_lock:
+                self._conn.execute(SQL_VERIFY_SIGNAL, (outcome, signal_id))
             logger.info(f"Verified signal {signal_id} with outcome {outcome}")
             return True
         except Exception as e:
             logger.error(f"Error verifying signal: {str(e)}")
             return False
+    
+    def close(self):
+        """Schließt die Datenbankverbindung"""
+        with self._db_lock:
+            self._conn.close()
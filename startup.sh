@@ -17,28 +17,9 @@ log "Aktiviere Python-Umgebung"
 source trading_env/bin/activate
 
 # Starten der Komponenten
-log "Starte Data Collector"
-python run_collector.py > logs/collector.log 2>&1 &
-
-# Kurz warten, um sicherzustellen, dass der Collector gestartet ist
-sleep 5
-
-log "Starte Technical Analyzer"
-python run_technical_analysis.py > logs/technical.log 2>&1 &
-
-sleep 3
-
-log "Starte Signal Generator"
-python run_signal_generator.py > logs/signal.log 2>&1 &
-
-sleep 3
-
-log "Starte Notifier"
-python run_notifier.py > logs/notifier.log 2>&1 &
-
-sleep 3
-
-log "Starte System-Monitor"
-python run_maintenance.py --email "IHRE_PCLOUD_EMAIL" --password "IHR_PCLOUD_PASSWORT" > logs/maintenance.log 2>&1 &
+# Alle Komponenten laufen in einem Prozess mit gemeinsamem Scheduler,
+# die einzelnen run_*.py-Skripte lassen sich weiterhin getrennt starten
+log "Starte Trading Signal System"
+python run_all.py --email "IHRE_PCLOUD_EMAIL" --password "IHR_PCLOUD_PASSWORT" > logs/trading_system.log 2>&1 &
 
 log "Alle Komponenten gestartet"
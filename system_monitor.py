@@ -1,11 +1,12 @@
 import psutil
 import os
+import sys
 import logging
 import time
 import datetime
-import sqlite3
 import schedule
 import subprocess
+from db_utils import open_db
 
 # Logger konfigurieren
 logging.basicConfig(
@@ -15,17 +16,48 @@ logging.basicConfig(
 )
 logger = logging.getLogger('SystemMonitor')
 
+# Gelesene Bytes je /proc/<pid>/cmdline
+CMDLINE_READ_SIZE = 4096
+
+# SQL-Anweisung als Konstante, damit jeder Lauf den Statement-Cache der Verbindung trifft
+SQL_INSERT_STATUS = '''
+INSERT INTO system_status
+(timestamp, cpu_usage, memory_usage, disk_usage, db_size, 
+data_collector_running, technical_analyzer_running, 
+signal_generator_running, notifier_running)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Die Festplattenbelegung ändert sich langsam und wird höchstens so oft (Sekunden) neu abgefragt
+DISK_CHECK_INTERVAL = 3600
+
 class SystemMonitor:
-    def __init__(self, db_path='market_data.db', scripts_dir='.'):
+    def __init__(self, db_path='market_data.db', scripts_dir='.', embedded_components=()):
         """
         Initialisiert den System-Monitor
         
         Args:
             db_path: Pfad zur SQLite-Datenbank
             scripts_dir: Verzeichnis mit den Python-Skripten
+            embedded_components: Komponenten (z. B. 'data_collector'), die im selben Prozess
+                                 laufen und daher weder gesucht noch neu gestartet werden
         """
         self.db_path = db_path
         self.scripts_dir = scripts_dir
+        self.embedded_components = set(embedded_components)
+        
+        # Vom Monitor gestartete Prozesse je Skriptname, ihre Lebendigkeit liefert poll() ohne Prozesssuche
+        self.children = {}
+        
+        # Eine Verbindung für die gesamte Laufzeit statt einer neuen bei jedem Monitoring-Lauf
+        self._conn = open_db(db_path)
+        
+        # Letzte Festplattenabfrage, damit disk_usage nicht bei jedem Lauf aufgerufen wird
+        self._last_disk_check_ts = None
+        self._last_disk_percent = None
+        
+        # cpu_percent() misst seit dem letzten Aufruf, der erste Aufruf liefert immer 0.0
+        psutil.cpu_percent()
         
         # Status-Tabelle in der Datenbank erstellen
         self._create_status_table()
@@ -35,10 +67,7 @@ class SystemMonitor:
     def _create_status_table(self):
         """Erstellt die Status-Tabelle in der Datenbank"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
+            self._conn.execute('''
             CREATE TABLE IF NOT EXISTS system_status (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp TEXT,
@@ -53,8 +82,6 @@ class SystemMonitor:
             )
             ''')
             
-            conn.commit()
-            conn.close()
             logger.info("Status table created or already exists")
         except Exception as e:
             logger.error(f"Error creating status table: {str(e)}")
@@ -69,19 +96,28 @@ class SystemMonitor:
         try:
             cpu_percent = psutil.cpu_percent()
             memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
             
-            # Größe der Datenbankdatei
-            db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+            # Festplattenbelegung nur nach Ablauf des Intervalls neu abfragen
+            now = time.monotonic()
+            if self._last_disk_check_ts is None or now - self._last_disk_check_ts >= DISK_CHECK_INTERVAL:
+                self._last_disk_percent = psutil.disk_usage('/').percent
+                self._last_disk_check_ts = now
+            disk_percent = self._last_disk_percent
+            
+            # Größe der Datenbankdatei mit einem einzigen stat-Aufruf
+            try:
+                db_size = os.stat(self.db_path).st_size
+            except FileNotFoundError:
+                db_size = 0
             
             resources = {
                 'cpu_usage': cpu_percent,
                 'memory_usage': memory.percent,
-                'disk_usage': disk.percent,
+                'disk_usage': disk_percent,
                 'db_size': db_size
             }
             
-            logger.info(f"System resources: CPU {cpu_percent}%, Memory {memory.percent}%, Disk {disk.percent}%")
+            logger.info(f"System resources: CPU {cpu_percent}%, Memory {memory.percent}%, Disk {disk_percent}%")
             return resources
         except Exception as e:
             logger.error(f"Error checking system resources: {str(e)}")
@@ -103,22 +139,22 @@ class SystemMonitor:
                 'notifier': 'run_notifier.py'
             }
             
+            # Komponenten im eigenen Prozess laufen, solange der Monitor läuft, und werden nicht gesucht
+            wanted = {script for key, script in script_names.items() if key not in self.embedded_components}
+            
+            # Selbst gestartete Prozesse über ihr Handle prüfen, gesucht wird nur nach den übrigen
+            running_children = self._poll_children()
+            wanted -= running_children
+            running_scripts = running_children | (self._find_running_scripts(wanted) if wanted else set())
+            
             # Status sammeln
             status = {}
             for key, script in script_names.items():
-                # Prüfen, ob der Prozess läuft
-                running = False
-                for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                    try:
-                        # Für Python-Prozesse die Kommandozeile prüfen
-                        if 'python' in proc.info['name'].lower() and proc.info['cmdline']:
-                            cmd = ' '.join(proc.info['cmdline'])
-                            if script in cmd:
-                                running = True
-                                break
-                    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                        pass
+                if key in self.embedded_components:
+                    status[f"{key}_running"] = 1
+                    continue
                 
+                running = script in running_scripts
                 status[f"{key}_running"] = 1 if running else 0
                 logger.info(f"Process {script} is {'running' if running else 'not running'}")
             
@@ -127,6 +163,96 @@ class SystemMonitor:
             logger.error(f"Error checking processes: {str(e)}")
             return None
     
+    def _poll_children(self):
+        """
+        Prüft die vom Monitor gestarteten Prozesse über ihre Popen-Handles
+        
+        Beendete Prozesse werden dabei abgeholt und aus self.children entfernt.
+        
+        Returns:
+            Menge der Skriptnamen, deren Prozess noch läuft
+        """
+        running = set()
+        for script, proc in list(self.children.items()):
+            if proc.poll() is None:
+                running.add(script)
+            else:
+                logger.info(f"Process {script} (PID {proc.pid}) exited with code {proc.returncode}")
+                del self.children[script]
+        return running
+    
+    def _find_running_scripts(self, wanted):
+        """
+        Sucht in einem Durchlauf über alle Prozesse, welche der Skripte laufen
+        
+        Args:
+            wanted: Menge der gesuchten Skriptnamen
+            
+        Returns:
+            Menge der laufenden Skriptnamen
+        """
+        # Unter Linux reicht es, die Kommandozeilen direkt aus /proc zu lesen
+        if sys.platform.startswith('linux'):
+            return self._find_running_scripts_proc(wanted)
+        
+        found = set()
+        for proc in psutil.process_iter(['name', 'cmdline']):
+            try:
+                # Für Python-Prozesse die Kommandozeile prüfen
+                if 'python' in proc.info['name'].lower() and proc.info['cmdline']:
+                    cmd = ' '.join(proc.info['cmdline'])
+                    found.update(script for script in wanted - found if script in cmd)
+                    if found == wanted:
+                        break
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+        
+        return found
+    
+    def _find_running_scripts_proc(self, wanted):
+        """
+        Sucht die laufenden Skripte über /proc, ohne für jeden Prozess ein psutil-Objekt anzulegen
+        
+        Args:
+            wanted: Menge der gesuchten Skriptnamen
+            
+        Returns:
+            Menge der laufenden Skriptnamen
+        """
+        wanted_bytes = {script.encode(): script for script in wanted}
+        found = set()
+        with os.scandir('/proc') as entries:
+            for entry in entries:
+                if not entry.name.isdigit():
+                    continue
+                # Rohes os.open/os.read statt open(): keine fstat-, ioctl- und lseek-Aufrufe für ein
+                # Dateiobjekt, pro Prozess bleiben nur openat, read und close
+                try:
+                    fd = os.open(f'/proc/{entry.name}/cmdline', os.O_RDONLY | os.O_CLOEXEC)
+                except OSError:
+                    # Prozess inzwischen beendet oder kein Zugriff
+                    continue
+                try:
+                    # Interpreter und Skriptpfad stehen am Anfang, eine Seite genügt
+                    cmdline = os.read(fd, CMDLINE_READ_SIZE)
+                except OSError:
+                    continue
+                finally:
+                    os.close(fd)
+                
+                # Argumente sind durch Nullbytes getrennt, das erste ist das Programm
+                args = cmdline.split(b'\x00')
+                if b'python' not in os.path.basename(args[0]).lower():
+                    continue
+                
+                for script_bytes, script in wanted_bytes.items():
+                    if script not in found and any(script_bytes in arg for arg in args[1:]):
+                        found.add(script)
+                if len(found) == len(wanted_bytes):
+                    break
+        
+        return found
+    
     def restart_process(self, script_name):
         """
         Startet einen nicht laufenden Prozess neu
@@ -146,10 +272,11 @@ class SystemMonitor:
             if os.name == 'nt':  # Windows
                 subprocess.Popen(['start', 'python', script_path], shell=True)
             else:  # Linux/Unix
-                subprocess.Popen(['python3', script_path], 
-                                stdout=subprocess.DEVNULL, 
-                                stderr=subprocess.DEVNULL, 
-                                start_new_session=True)
+                # Handle behalten, damit check_processes den Prozess ohne Suche prüfen kann
+                self.children[script_name] = subprocess.Popen(['python3', script_path], 
+                                                              stdout=subprocess.DEVNULL, 
+                                                              stderr=subprocess.DEVNULL, 
+                                                              start_new_session=True)
             
             logger.info(f"Restarted process {script_name}")
             return True
@@ -157,11 +284,16 @@ class SystemMonitor:
             logger.error(f"Error restarting process {script_name}: {str(e)}")
             return False
     
-    def check_and_restart_processes(self):
-        """Überprüft alle Prozesse und startet nicht laufende neu"""
+    def check_and_restart_processes(self, processes=None):
+        """
+        Überprüft alle Prozesse und startet nicht laufende neu
+        
+        Args:
+            processes: Bereits ermittelter Prozessstatus aus check_processes (optional)
+        """
         try:
-            # Prozessstatus abrufen
-            status = self.check_processes()
+            # Prozessstatus abrufen, falls er nicht schon vorliegt
+            status = processes if processes is not None else self.check_processes()
             
             if not status:
                 logger.error("Failed to check process status")
@@ -183,12 +315,20 @@ class SystemMonitor:
         except Exception as e:
             logger.error(f"Error in check_and_restart_processes: {str(e)}")
     
-    def save_status(self):
-        """Speichert den aktuellen Systemstatus in der Datenbank"""
+    def save_status(self, resources=None, processes=None):
+        """
+        Speichert den aktuellen Systemstatus in der Datenbank
+        
+        Args:
+            resources: Bereits ermittelte Ressourcendaten aus check_system_resources (optional)
+            processes: Bereits ermittelter Prozessstatus aus check_processes (optional)
+        """
         try:
-            # Ressourcen und Prozessstatus abrufen
-            resources = self.check_system_resources()
-            processes = self.check_processes()
+            # Ressourcen und Prozessstatus abrufen, falls sie nicht schon vorliegen
+            if resources is None:
+                resources = self.check_system_resources()
+            if processes is None:
+                processes = self.check_processes()
             
             if not resources or not processes:
                 logger.error("Failed to collect system status")
@@ -202,16 +342,7 @@ class SystemMonitor:
             }
             
             # In die Datenbank speichern
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            INSERT INTO system_status
-            (timestamp, cpu_usage, memory_usage, disk_usage, db_size, 
-            data_collector_running, technical_analyzer_running, 
-            signal_generator_running, notifier_running)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            self._conn.execute(SQL_INSERT_STATUS, (
                 data['timestamp'],
                 data['cpu_usage'],
                 data['memory_usage'],
@@ -223,9 +354,6 @@ class SystemMonitor:
                 data['notifier_running']
             ))
             
-            conn.commit()
-            conn.close()
-            
             logger.info("System status saved to database")
             return True
         except Exception as e:
@@ -236,10 +364,18 @@ class SystemMonitor:
         """Führt den vollständigen Monitoring-Prozess durch"""
         logger.info("Starting system monitoring")
         
+        # Prozesse nur einmal pro Lauf durchsuchen, das Ergebnis nutzen Speichern und Neustart gemeinsam
+        processes = self.check_processes()
+        resources = self.check_system_resources()
+        
         # Systemstatus speichern
-        self.save_status()
+        self.save_status(resources, processes)
         
         # Prozesse überprüfen und ggf. neustarten
-        self.check_and_restart_processes()
+        self.check_and_restart_processes(processes)
         
         logger.info("System monitoring completed")
+    
+    def close(self):
+        """Schließt die Datenbankverbindung"""
+        self._conn.close()
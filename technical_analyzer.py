@@ -1,8 +1,11 @@
 import pandas as pd
 import numpy as np
-import sqlite3
 import logging
 import datetime
+import itertools
+import operator
+import threading
+from db_utils import open_db
 
 # Logger konfigurieren
 logging.basicConfig(
@@ -12,6 +15,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger('TechnicalAnalyzer')
 
+# SQL-Anweisungen als Konstanten, damit jeder Aufruf den Statement-Cache der Verbindung trifft
+SQL_MARKET_DATA = '''
+SELECT timestamp, open, high, low, close, volume
+FROM market_data
+WHERE symbol = ?
+AND timestamp >= ?
+ORDER BY timestamp
+'''
+
+SQL_CLOSE_PRICES = '''
+SELECT close
+FROM market_data
+WHERE symbol = ?
+AND timestamp >= ?
+ORDER BY timestamp
+'''
+
+SQL_INSERT_ANALYSIS = '''
+INSERT INTO technical_analysis
+(symbol, timestamp, close_price, sma_20, sma_50, rsi, macd_line, 
+signal_line, overall_signal, signal_strength)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Datentyp der Schlusskurse für die Indikatorberechnung: float32 reicht für Kurse und Indikatoren
+# (etwa 7 signifikante Stellen) und halbiert die Arraygröße. Ergebnisse werden als Python-float
+# zurückgegeben und wie bisher in REAL-Spalten gespeichert.
+INDICATOR_DTYPE = np.float32
+
+# Stimmen der Einzelsignale für das Gesamtsignal
+SIGNAL_VOTES = {'BUY': 1, 'SELL': -1, 'NEUTRAL': 0}
+
 class TechnicalAnalyzer:
     def __init__(self, db_path):
         """
@@ -21,8 +56,44 @@ class TechnicalAnalyzer:
             db_path: Pfad zur SQLite-Datenbank
         """
         self.db_path = db_path
+        
+        # Eine Verbindung für die gesamte Laufzeit, der Lock schützt sie bei gemeinsamer Nutzung aus mehreren Threads
+        self._conn = open_db(db_path, cached_statements=256)
+        self._db_lock = threading.Lock()
+        
+        # Letztes Ergebnis je Symbol mit dem Schlüssel (letzter Bar, Fensterbeginn), aus dem es berechnet wurde
+        self._result_cache = {}
+        
+        # Ergebnistabelle einmalig anlegen
+        self._create_analysis_table()
+        
         logger.info(f"TechnicalAnalyzer initialized with database at {db_path}")
     
+    def _create_analysis_table(self):
+        """Erstellt die Tabelle für die Analyseergebnisse in der Datenbank"""
+        try:
+            with self._db_lock:
+                self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS technical_analysis (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    symbol TEXT,
+                    timestamp TEXT,
+                    close_price REAL,
+                    sma_20 REAL,
+                    sma_50 REAL,
+                    rsi REAL,
+                    macd_line REAL,
+                    signal_line REAL,
+                    overall_signal TEXT,
+                    signal_strength REAL
+                )
+                ''')
+                self._conn.execute('CREATE INDEX IF NOT EXISTS idx_technical_ts ON technical_analysis(symbol, timestamp)')
+            
+            logger.info("Technical analysis table created or already exists")
+        except Exception as e:
+            logger.error(f"Error creating technical analysis table: {str(e)}")
+    
     def _get_market_data(self, symbol, days=30):
         """
         Holt Marktdaten für ein Symbol aus der Datenbank
@@ -35,23 +106,14 @@ class TechnicalAnalyzer:
             Ein Pandas DataFrame mit den Marktdaten
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            
             # Zeitpunkt berechnen, ab dem Daten geholt werden sollen
             end_date = datetime.datetime.now()
             start_date = end_date - datetime.timedelta(days=days)
             
-            # Daten aus der Datenbank abrufen
-            query = f"""
-            SELECT timestamp, open, high, low, close, volume
-            FROM market_data
-            WHERE symbol = '{symbol}'
-            AND timestamp >= '{start_date.strftime('%Y-%m-%d')}'
-            ORDER BY timestamp
-            """
-            
-            df = pd.read_sql_query(query, conn)
-            conn.close()
+            # Daten aus der Datenbank abrufen, gebundene Parameter statt eingesetzter Werte
+            with self._db_lock:
+                df = pd.read_sql_query(SQL_MARKET_DATA, self._conn,
+                                       params=(symbol, start_date.strftime('%Y-%m-%d')))
             
             if df.empty:
                 logger.warning(f"No market data found for {symbol}")
@@ -67,6 +129,118 @@ class TechnicalAnalyzer:
             logger.error(f"Error getting market data for {symbol}: {str(e)}")
             return None
     
+    def _get_close_series(self, symbol, days=30):
+        """
+        Holt nur die Schlusskurse eines Symbols aus der Datenbank
+        
+        Für die Indikatoren wird nur die Spalte close gebraucht, daher entfallen hier
+        DataFrame, Zeitstempel-Parsing und Index. Die übrigen OHLCV-Spalten liefert
+        weiterhin _get_market_data.
+        
+        Args:
+            symbol: Das Aktiensymbol
+            days: Anzahl der Tage in die Vergangenheit
+            
+        Returns:
+            NumPy-Array (INDICATOR_DTYPE) mit den Schlusskursen in zeitlicher Reihenfolge oder None
+        """
+        try:
+            start_date = datetime.datetime.now() - datetime.timedelta(days=days)
+            
+            with self._db_lock:
+                rows = self._conn.execute(SQL_CLOSE_PRICES, (symbol, start_date.strftime('%Y-%m-%d'))).fetchall()
+            
+            if not rows:
+                logger.warning(f"No market data found for {symbol}")
+                return None
+            
+            # Fehlende Kurse (NULL) werden zu NaN
+            close = np.array([row[0] for row in rows], dtype=INDICATOR_DTYPE)
+            
+            logger.info(f"Retrieved {len(close)} market data points for {symbol}")
+            return close
+        except Exception as e:
+            logger.error(f"Error getting market data for {symbol}: {str(e)}")
+            return None
+    
+    def _get_close_series_many(self, symbols, days=30):
+        """
+        Holt die Schlusskurse mehrerer Symbole mit einer Abfrage aus der Datenbank
+        
+        Args:
+            symbols: Liste von Aktiensymbolen
+            days: Anzahl der Tage in die Vergangenheit
+            
+        Returns:
+            Dict von Symbol auf ein NumPy-Array (INDICATOR_DTYPE) mit den Schlusskursen (Symbole ohne Daten fehlen)
+            oder None bei Fehler
+        """
+        try:
+            start_date = datetime.datetime.now() - datetime.timedelta(days=days)
+            placeholders = ', '.join('?' * len(symbols))
+            query = f"""
+            SELECT symbol, close
+            FROM market_data
+            WHERE symbol IN ({placeholders})
+            AND timestamp >= ?
+            ORDER BY symbol, timestamp
+            """
+            
+            with self._db_lock:
+                rows = self._conn.execute(query, (*symbols, start_date.strftime('%Y-%m-%d'))).fetchall()
+            
+            # Zeilen sind nach Symbol sortiert, jede Gruppe wird direkt zu einem Array
+            closes = {}
+            for symbol, symbol_rows in itertools.groupby(rows, key=operator.itemgetter(0)):
+                closes[symbol] = np.array([row[1] for row in symbol_rows], dtype=INDICATOR_DTYPE)
+            
+            logger.info(f"Retrieved {len(rows)} market data points for {len(closes)} symbols")
+            return closes
+        except Exception as e:
+            logger.error(f"Error getting market data for {len(symbols)} symbols: {str(e)}")
+            return None
+    
+    def _get_last_bar_timestamps(self, symbols):
+        """
+        Holt den Zeitstempel des neuesten Bars je Symbol über den Index (symbol, timestamp)
+        
+        Args:
+            symbols: Liste von Aktiensymbolen
+            
+        Returns:
+            Dict von Symbol auf den neuesten Zeitstempel (leer bei Fehler)
+        """
+        try:
+            placeholders = ', '.join('?' * len(symbols))
+            query = f"""
+            SELECT symbol, MAX(timestamp)
+            FROM market_data
+            WHERE symbol IN ({placeholders})
+            GROUP BY symbol
+            """
+            
+            with self._db_lock:
+                return dict(self._conn.execute(query, tuple(symbols)).fetchall())
+        except Exception as e:
+            logger.error(f"Error getting latest market data timestamps: {str(e)}")
+            return {}
+    
+    @staticmethod
+    def _cache_key(last_bar, days):
+        """Schlüssel für den Ergebnis-Cache: ändert sich mit einem neuen Bar oder einem neuen Fensterbeginn"""
+        if last_bar is None:
+            return None
+        start_date = datetime.datetime.now() - datetime.timedelta(days=days)
+        return (last_bar, start_date.strftime('%Y-%m-%d'))
+    
+    def _cached_result(self, symbol, cache_key, timestamp):
+        """Gibt das zwischengespeicherte Ergebnis mit neuem Zeitstempel zurück, wenn seit der Berechnung kein Bar hinzukam"""
+        cached = self._result_cache.get(symbol)
+        if cache_key is None or cached is None or cached[0] != cache_key:
+            return None
+        logger.info(f"No new market data for {symbol}, reusing technical analysis")
+        return dict(cached[1], timestamp=timestamp)
+    
     def calculate_sma(self, df, window):
         """Berechnet Simple Moving Average"""
         return df['close'].rolling(window=window).mean()
@@ -76,14 +250,28 @@ class TechnicalAnalyzer:
         return df['close'].ewm(span=window, adjust=False).mean()
     
     def calculate_rsi(self, df, window=14):
-        """Berechnet Relative Strength Index"""
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-        
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi
+        """Berechnet Relative Strength Index mit Wilder-Glättung"""
+        close = df['close'].to_numpy(dtype=float)
+        rsi = np.full_like(close, np.nan)
+        if len(close) <= window:
+            return pd.Series(rsi, index=df.index)
+        
+        # Kursänderungen, fehlende Kurse zählen weder als Gewinn noch als Verlust
+        delta = close[1:] - close[:-1]
+        with np.errstate(invalid='ignore'):
+            gain = np.where(delta > 0, delta, 0.0)
+            loss = np.where(delta < 0, -delta, 0.0)
+        
+        # Startwert ist der einfache Mittelwert der ersten window Änderungen, danach rekursiv mit alpha = 1/window
+        avg_gain = gain[:window].mean()
+        avg_loss = loss[:window].mean()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi[window] = 100 - (100 / (1 + avg_gain / avg_loss))
+            for i in range(window, len(delta)):
+                avg_gain = (avg_gain * (window - 1) + gain[i]) / window
+                avg_loss = (avg_loss * (window - 1) + loss[i]) / window
+                rsi[i + 1] = 100 - (100 / (1 + avg_gain / avg_loss))
+        return pd.Series(rsi, index=df.index)
     
     def calculate_macd(self, df, fast=12, slow=26, signal=9):
         """Berechnet MACD (Moving Average Convergence Divergence)"""
@@ -112,6 +300,103 @@ class TechnicalAnalyzer:
             'lower_band': lower_band
         }
     
+    @staticmethod
+    def _wilder_rsi_last(values, window=14):
+        """
+        Berechnet nur den letzten RSI-Wert mit Wilder-Glättung (alpha = 1/window)
+        
+        Die Rekursion avg = avg * (1 - alpha) + alpha * x wird geschlossen ausgewertet:
+        der Startwert (Mittel der ersten window Änderungen) und jede weitere Änderung gehen
+        mit ihrem Gewicht (1 - alpha)^k in ein Skalarprodukt ein, ohne Schleife in Python.
+        
+        Args:
+            values: Die Schlusskurse als NumPy-Array
+            window: Fenster für den RSI
+            
+        Returns:
+            Der letzte RSI-Wert oder NaN bei zu wenigen Kursen
+        """
+        if len(values) <= window:
+            return np.nan
+        
+        # Kursänderungen, fehlende Kurse zählen weder als Gewinn noch als Verlust
+        delta = values[1:] - values[:-1]
+        with np.errstate(invalid='ignore'):
+            gain = np.where(delta > 0, delta, 0.0)
+            loss = np.where(delta < 0, -delta, 0.0)
+        
+        decay = 1.0 - 1.0 / window
+        tail = len(delta) - window
+        weights = (1.0 / window) * decay ** np.arange(tail - 1, -1, -1)
+        avg_gain = decay ** tail * gain[:window].mean() + weights @ gain[window:]
+        avg_loss = decay ** tail * loss[:window].mean() + weights @ loss[window:]
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 100 - (100 / (1 + avg_gain / avg_loss))
+    
+    @staticmethod
+    def _latest_window(values, window):
+        """Gibt die letzten window Werte zurück oder None, wenn es weniger gibt"""
+        return values[-window:] if len(values) >= window else None
+    
+    def _compute_latest_indicators(self, close, rsi_window=14, bollinger_window=20, num_std=2):
+        """
+        Berechnet die neuesten Werte aller Indikatoren in einem Durchgang über die Schlusskurse
+        
+        Liefert dieselben Werte wie die letzten Einträge von calculate_sma, calculate_ema,
+        calculate_rsi, calculate_macd und calculate_bollinger_bands, ohne für jeden Indikator
+        eine vollständige Zeitreihe anzulegen. SMA20 wird für Bollinger wiederverwendet,
+        EMA12/26 für den MACD.
+        
+        Args:
+            close: Die Schlusskurse als NumPy-Array
+            rsi_window: Fenster für den RSI
+            bollinger_window: Fenster für die Bollinger Bands
+            num_std: Anzahl der Standardabweichungen für die Bollinger Bands
+            
+        Returns:
+            Dict mit den neuesten Indikatorwerten
+        """
+        values = np.asarray(close, dtype=INDICATOR_DTYPE)
+        
+        # Gleitende Durchschnitte: nur das letzte Fenster, NaN wie bei rolling() bei zu wenigen oder fehlenden Werten
+        window_20 = self._latest_window(values, 20)
+        window_50 = self._latest_window(values, 50)
+        sma_20 = window_20.mean() if window_20 is not None else np.nan
+        sma_50 = window_50.mean() if window_50 is not None else np.nan
+        
+        # EMAs einmal berechnen und für den MACD wiederverwenden, die Series ohne Index dient nur für ewm()
+        close = pd.Series(values)
+        ema_12_series = close.ewm(span=12, adjust=False).mean()
+        ema_26_series = close.ewm(span=26, adjust=False).mean()
+        macd_series = ema_12_series - ema_26_series
+        signal_line = macd_series.ewm(span=9, adjust=False).mean().iloc[-1]
+        
+        # RSI mit Wilder-Glättung, nur der letzte Wert
+        rsi = self._wilder_rsi_last(values, rsi_window)
+        
+        # Bollinger Bands aus SMA20 und der Standardabweichung desselben Fensters
+        if window_20 is not None and bollinger_window == 20:
+            bollinger_values = window_20
+            middle = sma_20
+        else:
+            bollinger_values = self._latest_window(values, bollinger_window)
+            middle = bollinger_values.mean() if bollinger_values is not None else np.nan
+        std = bollinger_values.std(ddof=1) if bollinger_values is not None else np.nan
+        
+        # Als Python-float zurückgeben, sqlite3 kann NumPy-float32 nicht binden
+        return {
+            'sma_20': float(sma_20),
+            'sma_50': float(sma_50),
+            'ema_12': float(ema_12_series.iloc[-1]),
+            'ema_26': float(ema_26_series.iloc[-1]),
+            'rsi': float(rsi),
+            'macd_line': float(macd_series.iloc[-1]),
+            'signal_line': float(signal_line),
+            'upper_band': float(middle + std * num_std),
+            'lower_band': float(middle - std * num_std)
+        }
+    
     def analyze_symbol(self, symbol):
         """
         Führt eine technische Analyse für ein Symbol durch
@@ -122,32 +407,87 @@ class TechnicalAnalyzer:
         Returns:
             Ein Dictionary mit technischen Indikatoren und Signalen
         """
-        df = self._get_market_data(symbol)
-        if df is None or len(df) < 30:
+        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        # Ohne neuen Bar seit der letzten Analyse bleiben Indikatoren und Signale gleich
+        cache_key = self._cache_key(self._get_last_bar_timestamps([symbol]).get(symbol), 30)
+        results = self._cached_result(symbol, cache_key, timestamp)
+        if results is not None:
+            return results
+        
+        results = self._analyze_market_data(symbol, self._get_close_series(symbol), timestamp)
+        if results is not None and cache_key is not None:
+            self._result_cache[symbol] = (cache_key, results)
+        return results
+    
+    def analyze_batch(self, symbols, days=30):
+        """
+        Führt die technische Analyse für mehrere Symbole mit einer gemeinsamen Datenbankabfrage durch
+        
+        Args:
+            symbols: Liste von Aktiensymbolen
+            days: Anzahl der Tage in die Vergangenheit
+            
+        Returns:
+            Liste mit einem Ergebnis wie bei analyze_symbol je Symbol (None bei zu wenig Daten)
+        """
+        if not symbols:
+            return []
+        
+        # Ein gemeinsamer Zeitstempel für den ganzen Lauf, nur einmal formatiert
+        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        # Nur Symbole mit neuen Bars seit der letzten Analyse werden neu berechnet
+        last_bars = self._get_last_bar_timestamps(symbols)
+        cache_keys = {symbol: self._cache_key(last_bars.get(symbol), days) for symbol in symbols}
+        results = {symbol: self._cached_result(symbol, cache_keys[symbol], timestamp) for symbol in symbols}
+        stale = [symbol for symbol in symbols if results[symbol] is None]
+        
+        if stale:
+            closes = self._get_close_series_many(stale, days)
+            if closes is None:
+                return [results[symbol] for symbol in symbols]
+            
+            for symbol in stale:
+                close = closes.get(symbol)
+                if close is None:
+                    logger.warning(f"No market data found for {symbol}")
+                result = self._analyze_market_data(symbol, close, timestamp)
+                if result is not None and cache_keys[symbol] is not None:
+                    self._result_cache[symbol] = (cache_keys[symbol], result)
+                results[symbol] = result
+        
+        return [results[symbol] for symbol in symbols]
+    
+    def _analyze_market_data(self, symbol, close, timestamp=None):
+        """
+        Berechnet Indikatoren und Signale aus den Schlusskursen eines Symbols
+        
+        Args:
+            symbol: Das Aktiensymbol
+            close: NumPy-Array mit den Schlusskursen oder None
+            timestamp: Formatierter Zeitstempel des Laufs (Standard: jetzt)
+            
+        Returns:
+            Ein Dictionary mit technischen Indikatoren und Signalen
+        """
+        if close is None or len(close) < 30:
             logger.warning(f"Insufficient data for technical analysis of {symbol}")
             return None
         
         try:
-            # Technische Indikatoren berechnen
-            sma_20 = self.calculate_sma(df, 20)
-            sma_50 = self.calculate_sma(df, 50)
-            ema_12 = self.calculate_ema(df, 12)
-            ema_26 = self.calculate_ema(df, 26)
-            rsi = self.calculate_rsi(df)
-            macd = self.calculate_macd(df)
-            bollinger = self.calculate_bollinger_bands(df)
-            
-            # Die neuesten Werte extrahieren
-            latest_close = df['close'].iloc[-1]
-            latest_sma_20 = sma_20.iloc[-1]
-            latest_sma_50 = sma_50.iloc[-1]
-            latest_ema_12 = ema_12.iloc[-1]
-            latest_ema_26 = ema_26.iloc[-1]
-            latest_rsi = rsi.iloc[-1]
-            latest_macd_line = macd['macd_line'].iloc[-1]
-            latest_signal_line = macd['signal_line'].iloc[-1]
-            latest_upper_band = bollinger['upper_band'].iloc[-1]
-            latest_lower_band = bollinger['lower_band'].iloc[-1]
+            # Nur die neuesten Werte der Indikatoren werden benötigt
+            latest_close = float(close[-1])
+            indicators = self._compute_latest_indicators(close)
+            latest_sma_20 = indicators['sma_20']
+            latest_sma_50 = indicators['sma_50']
+            latest_ema_12 = indicators['ema_12']
+            latest_ema_26 = indicators['ema_26']
+            latest_rsi = indicators['rsi']
+            latest_macd_line = indicators['macd_line']
+            latest_signal_line = indicators['signal_line']
+            latest_upper_band = indicators['upper_band']
+            latest_lower_band = indicators['lower_band']
             
             # Signale generieren
             signals = {}
@@ -177,16 +517,15 @@ class TechnicalAnalyzer:
             else:
                 signals['bollinger'] = 'NEUTRAL'
             
-            # Gesamtsignal berechnen
-            buy_signals = sum(1 for signal in signals.values() if signal == 'BUY')
-            sell_signals = sum(1 for signal in signals.values() if signal == 'SELL')
+            # Gesamtsignal in einem Durchgang über die Stimmen berechnen: die Summe entscheidet die
+            # Richtung, zusammen mit der Zahl der nicht neutralen Signale ergibt sie die Mehrheit
+            votes = [SIGNAL_VOTES[signal] for signal in signals.values()]
+            net_votes = sum(votes)
+            decided = len(votes) - votes.count(0)
             
-            if buy_signals > sell_signals:
-                overall_signal = 'BUY'
-                signal_strength = buy_signals / len(signals)
-            elif sell_signals > buy_signals:
-                overall_signal = 'SELL'
-                signal_strength = sell_signals / len(signals)
+            if net_votes:
+                overall_signal = 'BUY' if net_votes > 0 else 'SELL'
+                signal_strength = (decided + abs(net_votes)) / (2 * len(votes))
             else:
                 overall_signal = 'NEUTRAL'
                 signal_strength = 0.5
@@ -209,7 +548,7 @@ class TechnicalAnalyzer:
                 'signals': signals,
                 'overall_signal': overall_signal,
                 'signal_strength': signal_strength,
-                'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                'timestamp': timestamp or datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
             
             logger.info(f"Completed technical analysis for {symbol} with overall signal {overall_signal}")
@@ -228,34 +567,17 @@ class TechnicalAnalyzer:
         if not results:
             return
         
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Tabelle erstellen, falls sie nicht existiert
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS technical_analysis (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                symbol TEXT,
-                timestamp TEXT,
-                close_price REAL,
-                sma_20 REAL,
-                sma_50 REAL,
-                rsi REAL,
-                macd_line REAL,
-                signal_line REAL,
-                overall_signal TEXT,
-                signal_strength REAL
-            )
-            ''')
-            
-            # Ergebnisse speichern
-            cursor.execute('''
-            INSERT INTO technical_analysis
-            (symbol, timestamp, close_price, sma_20, sma_50, rsi, macd_line, 
-            signal_line, overall_signal, signal_strength)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+        self.save_all_analysis_results([results])
+    
+    def save_all_analysis_results(self, results_list):
+        """
+        Speichert die Analyseergebnisse mehrerer Symbole in einer Transaktion
+        
+        Args:
+            results_list: Liste von Analyseergebnissen
+        """
+        rows = [
+            (
                 results['symbol'],
                 results['timestamp'],
                 results['latest_close'],
@@ -266,10 +588,28 @@ class TechnicalAnalyzer:
                 results['indicators']['signal_line'],
                 results['overall_signal'],
                 results['signal_strength']
-            ))
-            
-            conn.commit()
-            conn.close()
-            logger.info(f"Saved technical analysis results for {results['symbol']}")
+            )
+            for results in results_list if results
+        ]
+        if not rows:
+            return
+        
+        try:
+            with self._db_lock:
+                cursor = self._conn.cursor()
+                cursor.execute('BEGIN')
+                try:
+                    cursor.executemany(SQL_INSERT_ANALYSIS, rows)
+                except Exception:
+                    if self._conn.in_transaction:
+                        cursor.execute('ROLLBACK')
+                    raise
+                cursor.execute('COMMIT')
+            logger.info(f"Saved technical analysis results for {len(rows)} symbols")
         except Exception as e:
             logger.error(f"Error saving analysis results: {str(e)}")
+    
+    def close(self):
+        """Schließt die Datenbankverbindung"""
+        with self._db_lock:
+            self._conn.close()